@@ -1,18 +1,23 @@
 # Main Function
 import os
+import logging
+import threading
 import streamlit as st
 from dotenv import load_dotenv
-from langchain.schema import AIMessage, HumanMessage
 
 # Helper Function
-from src.load_chunks import loadfile, docs_to_chunks
-from src.vectorstore import config_retriever
-from src.configchat import build_conversation, config_conversation
+## Only light modules at load time: the sidebar renders before LangChain, torch, FAISS or any provider is imported.
+## Heavy modules are imported where they are first used (see benchmarks/bench_import.py for the budget).
+from src import settings
+from src.chatlog import ChatLog, USER, ASSISTANT, source_refs
+from src.backends import GROQ_MODELS, KEYLESS_LLM_BACKENDS
+from src.tracing import SessionTrace, session_trace, record_error, start_metrics_server
 
 ## ---------------------------------------- ##
 
 # Load Environment variables
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 ## use for locally
 # model_api = os.getenv("GROQ_API_KEY")
@@ -21,46 +26,205 @@ load_dotenv()
 # model_api = st.secrets.get("GROQ_API_KEY", os.getenv("GROQ_API_KEY"))
 
 
-# Processing the Uploaded File
+# Warm the shared embedding model once per process
+@st.cache_resource(show_spinner=False)
+def prewarm():
+    ## Importing src.vectorstore (LangChain, numpy) is part of the warm-up: it runs off the script thread too
+    def _warm():
+        try:
+            from src.vectorstore import prewarm_embeddings
+            prewarm_embeddings()
+        except Exception:
+            logger.exception("Embedding model prewarm failed")
+
+    threading.Thread(target=_warm, name="embeddings-prewarm", daemon=True).start()
+    return True
+
+
+# Prometheus-style /metrics endpoint, one per process
+@st.cache_resource(show_spinner=False)
+def metrics_server(port):
+    return start_metrics_server(port)
+
+
+# Sidebar debug panel: where the time of this session went
+def debug_panel(trace):
+    from src.indexcache import get_index_cache
+    from src.answercache import get_answer_cache
+    from src.registry import get_index_registry
+    from src.jobs import get_ingest_queue
+
+    with st.sidebar.expander("🔎 Debug"):
+        st.caption("Seconds per stage")
+        st.json({stage: round(seconds, 3) for stage, seconds in trace.totals().items()})
+        st.caption("LLM tokens · cache hits · question rewrites (this session)")
+        st.json({"tokens": dict(trace.tokens), "cache": dict(trace.cache), "rewrite": dict(trace.rewrite)})
+        st.caption("Process")
+        index_cache, answer_cache = get_index_cache(), get_answer_cache()
+        st.json({
+            "index_cache": index_cache.stats() if index_cache else None,
+            "answer_cache": answer_cache.stats() if answer_cache else None,
+            "shared_indexes": get_index_registry().stats(),
+            "ingest_jobs": get_ingest_queue().stats(),
+        })
+
+
+def sources_caption(sources):
+    if sources:
+        st.caption("Sources: " + " · ".join(f"{s['source']} p.{s['page']}" for s in sources))
+
+
+# One chat bubble
+def render_message(message):
+    with st.chat_message(message.role):
+        st.markdown(message.content)
+        sources_caption(message.sources)
+
+
+# Chat transcript: the latest messages as bubbles, older ones one page at a time on request
+def render_chat_log(log):
+    if pages := log.n_pages():
+        if st.toggle(f"🕘 Show {log.n_older()} earlier messages"):
+            number = st.number_input("Page (1 = most recent)", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+            for message in log.page(number):
+                render_message(message)
+            st.divider()
+    for message in log.recent():
+        render_message(message)
+
+
+# Processing the Uploaded File: indexing runs as a background job, the script only submits it
 def processing(uploaded_file, inference, model_api, model_type):
     try:
-        ## Extract
-        doc = loadfile(uploaded_file)
-        ## Split document to Chunks
-        documents = docs_to_chunks(doc)
-        ## Embed + vectorstore
-        retriever = config_retriever(documents)
-        
-        return config_conversation(inference, model_api, retriever, model_type)
+        from src.indexcache import corpus_key
+        from src.jobs import IngestRejected, get_ingest_queue
+        from src.configchat import config_conversation
+
+        with session_trace(st.session_state.trace):
+            key = corpus_key(uploaded_file)
+            previous_job = st.session_state.ingest_job
+            if previous_job is not None:
+                previous_job.cancel()
+            ## Shared read-only index per corpus, files added/removed since the last Process only touch their own vectors
+            job = get_ingest_queue().submit(uploaded_file, key, st.session_state.index_handle, st.session_state.trace)
+            st.session_state.ingest_job = job
+            st.session_state.llm_config = (inference, model_api, model_type)
+            ## Usable right away: answers come from the chunks indexed so far (not cached, the corpus is incomplete)
+            return config_conversation(inference, model_api, job.retriever(), model_type)
+    except IngestRejected as e:
+        st.warning(f"🚦 {e}")
+        return st.session_state.conversation
     except Exception as e:
+        logger.exception("PDF processing failed")
+        record_error("processing")
         st.error("An error occurred during PDF processing. Please try again later.")
+        if settings.DEBUG_PANEL:
+            st.exception(e)
         return None
 
 
+# Finished job -> the session switches to the shared index (or back to its previous one)
+def finish_ingest(job):
+    from src.jobs import DONE, FAILED
+    from src.configchat import config_conversation
+
+    st.session_state.ingest_job = None
+    if job.state == DONE:
+        handle = job.take_handle()
+        previous = st.session_state.index_handle
+        if previous is not None and previous is not handle:
+            previous.release()
+        st.session_state.index_handle = handle
+    elif job.state == FAILED:
+        st.error("An error occurred during PDF processing. Please try again later.")
+        if settings.DEBUG_PANEL:
+            st.caption(job.error)
+    else:
+        st.info("⏹️ Processing cancelled.")
+
+    handle = st.session_state.index_handle
+    if handle is None:
+        st.session_state.conversation = None
+        return
+    inference, model_api, model_type = st.session_state.llm_config
+    conversation = config_conversation(
+        inference, model_api, handle.as_retriever(), model_type,
+        corpus_id=handle.key,
+    )
+    if st.session_state.conversation is not None:
+        ## Keep the questions asked while the documents were indexing
+        conversation.memory = st.session_state.conversation.memory
+    st.session_state.conversation = conversation
+
+
+# Live job status in the sidebar, polled without rerunning the whole script
+@st.fragment(run_every=1)
+def ingest_status():
+    job = st.session_state.ingest_job
+    if job is None:
+        return
+    if job.finished:
+        st.rerun() ## the full run applies the result (finish_ingest)
+
+    progress = job.progress
+    if job.state == "queued":
+        st.progress(0.0, text="⏳ Waiting for a free ingestion slot...")
+    elif progress["total"]:
+        st.progress(
+            progress["done"] / progress["total"],
+            text=f"🧠 Embedding {progress['done']}/{progress['total']} chunks · {progress['rate']:.0f} chunks/s · ETA {progress['eta'] or 0:.0f}s",
+        )
+    elif progress["files_total"]:
+        st.progress(
+            progress["files_done"] / progress["files_total"],
+            text=f"📄 Reading documents {progress['files_done']}/{progress['files_total']} · {progress['done']} chunks embedded",
+        )
+    else:
+        st.progress(0.0, text="📄 Reading documents...")
+    if job.partial:
+        st.caption("💬 You can already ask questions: answers use the chunks indexed so far.")
+    if st.button("✖️ Cancel processing", key=f"cancel-{job.id}"):
+        job.cancel()
+
+
 # Main Function
 def main():   
     if "conversation" not in st.session_state:
         st.session_state.conversation = None
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = None
+    if "chat_log" not in st.session_state:
+        st.session_state.chat_log = ChatLog(settings.CHAT_VISIBLE_MESSAGES, settings.CHAT_PAGE_SIZE)
+    if "index_handle" not in st.session_state:
+        st.session_state.index_handle = None
+    if "ingest_job" not in st.session_state:
+        st.session_state.ingest_job = None
+    if "llm_config" not in st.session_state:
+        st.session_state.llm_config = None
     if 'uploaded_file' not in st.session_state:
         st.session_state.uploaded_file = None
+    if "trace" not in st.session_state:
+        st.session_state.trace = SessionTrace()
         
     
     st.set_page_config(page_title="DoChatBot", page_icon="📃")
+    if settings.PREWARM_EMBEDDINGS:
+        prewarm()
+    if settings.METRICS_PORT:
+        metrics_server(settings.METRICS_PORT)
     st.sidebar.title("🤖📃 | DoChatBot")
     
-    ## Add any model here.....
-    inference = st.sidebar.selectbox("Inference", ['Groq'], index=None, placeholder='Inferencing...')
-    model_type = st.sidebar.selectbox("Models", ['Meta - Llama3', 'Google - Gemma2'], index=None, placeholder='Model Type...')
+    ## Add any model here..... (backends are registered in src/backends.py, offered via DOCHAT_INFERENCE_OPTIONS)
+    inference = st.sidebar.selectbox("Inference", settings.INFERENCE_OPTIONS, index=None, placeholder='Inferencing...')
+    model_type = st.sidebar.selectbox("Models", list(GROQ_MODELS), index=None, placeholder='Model Type...')
     
-    if inference == 'Groq':
-        st.sidebar.info("🙇Sorry... Our API Key in maintenance")
-        model_api = st.sidebar.text_input("Groq API Key", type="password")
-        st.sidebar.markdown("Create your own Groq API key [Get it here](https://console.groq.com/keys)")
-        if not model_api:
-            st.info("Please add your **Groq API key** to continue.")
-            st.stop()
+    if inference:
+        model_api = None
+        if inference not in KEYLESS_LLM_BACKENDS:
+            st.sidebar.info("🙇Sorry... Our API Key in maintenance")
+            model_api = st.sidebar.text_input(f"{inference} API Key", type="password")
+            st.sidebar.markdown("Create your own Groq API key [Get it here](https://console.groq.com/keys)")
+            if not model_api:
+                st.info(f"Please add your **{inference} API key** to continue.")
+                st.stop()
     
         uploaded_file = st.sidebar.file_uploader(label="Upload PDF files", type=["pdf"], accept_multiple_files=True)
         
@@ -75,24 +239,66 @@ def main():
             with b1:
                 bprocess = st.sidebar.button("🚀Process")
                 if bprocess:
-                    with st.spinner("🚀Processing..."):
-                       st.session_state.conversation = processing(uploaded_file, inference, model_api, model_type)            
+                    st.session_state.conversation = processing(uploaded_file, inference, model_api, model_type)
             with b2:
                 breset = st.sidebar.button("⏹️Reset chat..")
                 if breset:
                     with st.spinner("🥱Resetting session..."):
+                        if st.session_state.ingest_job is not None:
+                            st.session_state.ingest_job.cancel()
+                            st.session_state.ingest_job = None
                         st.session_state.conversation = None
-                        st.session_state.chat_history = None
+                        st.session_state.chat_log.clear()
+
+            ## Background ingestion: apply a finished job, otherwise show its live progress
+            job = st.session_state.ingest_job
+            if job is not None and job.finished:
+                finish_ingest(job)
+            ## (only while a job exists: idle sessions do not poll)
+            if st.session_state.ingest_job is not None:
+                with st.sidebar:
+                    ingest_status()
             
             
-            if user_query := st.chat_input(placeholder="Ask me anything about the document!"):    
-                with st.spinner("💡Thinking..."):       
-                    response = st.session_state.conversation({"question": user_query})
-                    st.session_state.chat_history = response["chat_history"]
-
-                    for i, message in enumerate(st.session_state.chat_history):
-                        with st.chat_message("user" if i % 2 == 0 else "assistant"):
-                            st.markdown(message.content)
+            ## Drawn from the typed log: bounded work per rerun however long the chat gets
+            chat_log = st.session_state.chat_log
+            render_chat_log(chat_log)
+
+            if user_query := st.chat_input(placeholder="Ask me anything about the document!"):
+                if st.session_state.conversation is None:
+                    st.info("🚀 Press **Process** to index the documents first.")
+                    st.stop()
+                render_message(chat_log.add(USER, user_query))
+
+                from src.callbacks import StreamHandler, TracingHandler
+                from src.asyncrun import Overloaded, stream_answer
+
+                ## Stream the answer into the assistant bubble token by token
+                with st.chat_message("assistant"):
+                    stream_handler = StreamHandler(st.empty())
+                    trace = st.session_state.trace
+                    if settings.ASYNC_CHAIN:
+                        ## Runs on the shared event loop (pooled clients, bounded concurrency), tokens rendered here
+                        try:
+                            response = stream_answer(
+                                st.session_state.conversation, {"question": user_query},
+                                stream_handler.on_answer_token, callbacks=[TracingHandler(trace)], trace=trace,
+                            )
+                        except Overloaded as e:
+                            st.warning(f"🚦 {e}")
+                            st.stop()
+                    else:
+                        with session_trace(trace):
+                            response = st.session_state.conversation(
+                                {"question": user_query}, callbacks=[stream_handler, TracingHandler(trace)]
+                            )
+                    stream_handler.finish(response["answer"])
+                    sources = source_refs(response.get("source_documents", []))
+                    sources_caption(sources)
+                chat_log.add(ASSISTANT, response["answer"], sources)
+
+            if settings.DEBUG_PANEL:
+                debug_panel(st.session_state.trace)
         
 if __name__ == "__main__":
     main()
\ No newline at end of file
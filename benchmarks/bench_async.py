@@ -0,0 +1,72 @@
+"""Concurrent chat turns through the async chain path, with no API quota used.
+
+--inference stub-groq: ChatGroq against the local stub server (includes our HTTP client overhead).
+--inference fake: the in-process deterministic fake LLM, no network at all; with --embed-backend fake
+the whole run is offline. Wall time minus the simulated model latency is our own overhead.
+
+Run: python -m benchmarks.bench_async [--inference fake] [--embed-backend fake] [--turns 200] [--latency 0.3] [--concurrency 16]
+"""
+import os
+import glob
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_groq import start_stub_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default="sample")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds before the first byte")
+    parser.add_argument("--concurrency", type=int, default=16, help="DOCHAT_LLM_CONCURRENCY")
+    parser.add_argument("--inference", choices=("stub-groq", "fake"), default="stub-groq")
+    parser.add_argument("--embed-backend", default=None, help="DOCHAT_EMBED_BACKEND (hf, onnx, fake)")
+    args = parser.parse_args()
+
+    ## Settings are read at import time: configure before importing the app modules
+    server = None
+    if args.inference == "stub-groq":
+        server, url = start_stub_server(latency=args.latency)
+        os.environ["DOCHAT_GROQ_BASE_URL"] = url
+    else:
+        os.environ["DOCHAT_FAKE_LLM_LATENCY"] = str(args.latency)
+    if args.embed_backend:
+        os.environ["DOCHAT_EMBED_BACKEND"] = args.embed_backend
+    os.environ["DOCHAT_LLM_CONCURRENCY"] = str(args.concurrency)
+    os.environ["DOCHAT_ANSWER_CACHE"] = "0"
+    from src.asyncrun import submit
+    from src.batch_qa import LocalFile
+    from src.configchat import config_conversation
+    from src.pipeline import acquire_index
+
+    files = [LocalFile(path) for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))]
+    retriever = acquire_index(files).as_retriever()
+    questions = [f"What does section {i % 7 + 1} say about the evaluation results?" for i in range(args.turns)]
+
+    def one_turn(question):
+        ## One session per turn: its own chain and memory, shared pooled client + event loop
+        if args.inference == "stub-groq":
+            chain = config_conversation("Groq", "stub-key", retriever, "Meta - Llama3")
+        else:
+            chain = config_conversation("Fake", None, retriever, "Meta - Llama3")
+        start = time.perf_counter()
+        submit(chain.ainvoke({"question": question})).result()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.turns) as pool:
+        latencies = sorted(pool.map(one_turn, questions))
+    wall = time.perf_counter() - start
+    if server is not None:
+        server.shutdown()
+
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(f"{args.turns} turns ({args.inference}), concurrency {args.concurrency}, model latency {args.latency}s")
+    print(f"wall {wall:.2f}s · {args.turns / wall:.1f} turns/s · p50 {statistics.median(latencies):.3f}s · p95 {p95:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
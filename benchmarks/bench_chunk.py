@@ -0,0 +1,58 @@
+"""Chunks/sec and chunk counts of the chunkers on the sample PDFs.
+
+Pages are extracted once, then every chunker splits the same pages. Token stats use the
+chunk sizing tokenizer (DOCHAT_CHUNK_TOKENIZER), "over limit" counts chunks the embedder would truncate.
+
+Run: python -m benchmarks.bench_chunk [--repeat 3] [--pdf-dir sample] [--limit 256]
+"""
+import os
+import glob
+import time
+import argparse
+import statistics
+
+from src.batch_qa import LocalFile
+from src.load_chunks import loadfile, make_splitter
+from src.chunker import get_token_counter
+
+CHUNKERS = ("recursive", "structured")
+
+
+def bench_chunker(name, pages, repeat):
+    ## Best of `repeat` runs, the splitter is built outside the timed part (it is reused in the app too)
+    splitter = make_splitter(name)
+    best, chunks = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = splitter.split_documents(pages)
+        best = min(best, time.perf_counter() - start)
+    return chunks, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default="sample")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=256, help="embedder max sequence length (tokens)")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not paths:
+        raise SystemExit(f"No PDFs found in {args.pdf_dir}")
+    pages = loadfile([LocalFile(path) for path in paths])
+    counter = get_token_counter()
+
+    print(f"{len(pages)} pages from {len(paths)} PDFs")
+    print(f"{'chunker':<12}{'chunks':>8}{'seconds':>10}{'chunks/sec':>12}{'pages/sec':>11}{'mean tok':>10}{'max tok':>9}{'over limit':>12}")
+    for name in CHUNKERS:
+        chunks, seconds = bench_chunker(name, pages, args.repeat)
+        tokens = counter([chunk.page_content for chunk in chunks]) or [0]
+        over = sum(count > args.limit for count in tokens)
+        print(
+            f"{name:<12}{len(chunks):>8}{seconds:>10.3f}{len(chunks) / seconds:>12.0f}{len(pages) / seconds:>11.0f}"
+            f"{statistics.mean(tokens):>10.0f}{max(tokens):>9}{over:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Pages/sec of every PDF extraction engine on the sample PDFs."""
+## Run: python -m benchmarks.bench_extract [--repeat 3] [--pdf-dir sample]
+import os
+import glob
+import time
+import argparse
+
+from src.load_chunks import EXTRACTORS, get_extractor
+
+
+def bench_engine(engine, paths, repeat):
+    extractor = get_extractor(engine)
+    pages, elapsed, metadata = 0, 0.0, []
+    for _ in range(repeat):
+        metadata = []
+        for path in paths:
+            with open(path, "rb") as f:
+                data = f.read()
+            start = time.perf_counter()
+            docs = extractor.extract(data, os.path.basename(path))
+            elapsed += time.perf_counter() - start
+            pages += len(docs)
+            metadata.extend(doc.metadata for doc in docs)
+    return pages, elapsed, metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdf-dir", default="sample")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not paths:
+        raise SystemExit(f"No PDFs found in {args.pdf_dir}")
+
+    results = {}
+    print(f"{'engine':<10}{'pages':>8}{'seconds':>10}{'pages/sec':>12}")
+    for engine in EXTRACTORS:
+        pages, elapsed, metadata = bench_engine(engine, paths, args.repeat)
+        results[engine] = metadata
+        print(f"{engine:<10}{pages:>8}{elapsed:>10.2f}{pages / elapsed:>12.1f}")
+
+    ## Both engines must hand identical metadata to the splitter
+    reference = next(iter(results.values()))
+    for engine, metadata in results.items():
+        print(f"metadata identical to {next(iter(results))}: {engine} -> {metadata == reference}")
+
+
+if __name__ == "__main__":
+    main()
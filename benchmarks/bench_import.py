@@ -0,0 +1,90 @@
+"""Cold import time of the app entry point and the heavy modules behind it, against a budget.
+
+Every measurement runs in a fresh interpreter (like a new Streamlit worker or container).
+Fails (exit 1) when `DoChatBot` is over budget or pulls in a module that must stay lazy.
+
+Run: python -m benchmarks.bench_import [--repeat 5] [--budget-ms 1500] [--top 10]
+"""
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+ENTRY = "DoChatBot"
+MODULES = (ENTRY, "src.configchat", "src.vectorstore", "src.pipeline", "src.load_chunks")
+## Must not be imported before the first upload / question
+LAZY = (
+    "torch", "sentence_transformers", "transformers", "faiss", "pymupdf", "pypdf",
+    "langchain", "langchain_core", "langchain_community", "langchain_huggingface",
+    "langchain_groq", "groq", "langchain_google_genai", "google.generativeai",
+)
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module):
+    ## (seconds, lazily-expected modules that were loaded, importtime lines)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, lazy=LAZY)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report["seconds"], report["loaded"], result.stderr.splitlines()
+
+
+def top_imports(lines, n):
+    ## Self import time summed per root package ("import time: self [us] | cumulative | name")
+    totals = {}
+    for line in lines:
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if self_us.isdigit():
+            root = name.split(".")[0]
+            totals[root] = totals.get(root, 0) + int(self_us) / 1e6
+    return sorted(((seconds, name) for name, seconds in totals.items()), reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500, help=f"median cold import budget of {ENTRY}")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'module':<20}{'median ms':>11}{'max ms':>9}")
+    entry_seconds, entry_loaded, entry_lines = None, [], []
+    for module in MODULES:
+        runs = [measure(module) for _ in range(args.repeat)]
+        seconds = [run[0] for run in runs]
+        print(f"{module:<20}{statistics.median(seconds) * 1000:>11.0f}{max(seconds) * 1000:>9.0f}")
+        if module == ENTRY:
+            entry_seconds, entry_loaded, entry_lines = statistics.median(seconds), runs[-1][1], runs[-1][2]
+
+    print(f"\nImport time of {ENTRY} by package:")
+    for seconds, name in top_imports(entry_lines, args.top):
+        print(f"  {seconds * 1000:>8.0f} ms  {name}")
+
+    failures = []
+    if entry_seconds * 1000 > args.budget_ms:
+        failures.append(f"{ENTRY} imports in {entry_seconds * 1000:.0f} ms, budget {args.budget_ms:.0f} ms")
+    if entry_loaded:
+        failures.append(f"{ENTRY} eagerly imports {', '.join(entry_loaded)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print(f"OK: {ENTRY} within {args.budget_ms:.0f} ms, no heavy module imported at start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Recall@k and query latency of every FAISS index type against the exact flat index.
+
+Run: python -m benchmarks.bench_index [--n 50000] [--queries 500] [--k 4]
+     python -m benchmarks.bench_index --pdf-dir sample   (real MiniLM vectors of the sample chunks)
+"""
+import os
+import glob
+import time
+import argparse
+import faiss
+import numpy as np
+
+from src.vectorstore import INDEX_TYPES, MIN_IVF_CHUNKS, make_faiss_index
+
+
+def synthetic_vectors(n, dimension, seed=0):
+    ## Clustered unit vectors, closer to sentence embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 200, 8), dimension))
+    vectors = centers[rng.integers(len(centers), size=n)] + 0.35 * rng.normal(size=(n, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def sample_vectors(pdf_dir):
+    from src.batch_qa import LocalFile
+    from src.load_chunks import load_chunks
+    from src.vectorstore import get_embeddings
+
+    files = [LocalFile(path) for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf")))]
+    texts = [chunk.page_content for chunk in load_chunks(files)]
+    return np.asarray(get_embeddings().embed_documents(texts), dtype=np.float32)
+
+
+def recall_at_k(found, truth, k):
+    return np.mean([len(set(f[:k]) & set(t[:k])) / k for f, t in zip(found, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--pdf-dir", default=None)
+    args = parser.parse_args()
+
+    vectors = sample_vectors(args.pdf_dir) if args.pdf_dir else synthetic_vectors(args.n, args.dimension)
+    n, dimension = vectors.shape
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(n, size=args.queries)] + 0.05 * rng.normal(size=(args.queries, dimension)).astype(np.float32)
+
+    print(f"{n} vectors x {dimension} dims, {args.queries} queries, k={args.k}")
+    print(f"{'index':<8}{'build s':>10}{'MB':>10}{'ms/query':>10}{'recall':>10}")
+    truth = None
+    for kind in INDEX_TYPES:
+        if kind in ("ivf", "ivfpq") and n < MIN_IVF_CHUNKS:
+            continue
+        start = time.perf_counter()
+        index = make_faiss_index(kind, dimension, n)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        build = time.perf_counter() - start
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+
+        start = time.perf_counter()
+        found = [index.search(query[None, :], args.k)[1][0] for query in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        if truth is None:
+            truth = found ## flat comes first: exact neighbours
+        print(f"{kind:<8}{build:>10.2f}{size_mb:>10.1f}{latency_ms:>10.3f}{recall_at_k(found, truth, args.k):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""End-to-end pipeline benchmark with per-stage wall time, peak RSS and throughput.
+
+Stages mirror DoChatBot.processing() + one chat turn: extract, split, embed, index, retrieve (+ rerank), generate.
+Embedding/indexing and retrieval go through the app's own functions (`build_vectorstore`, `make_retriever`), so
+batched embedding into the index, hybrid BM25 fusion and re-ranking are measured as configured.
+The embed/index and retrieve/rerank split comes from the spans those functions record (wall time and peak RSS
+are the ones of the enclosing block). Generation uses the offline fake LLM: no network, our own overhead only.
+
+Run: python -m benchmarks.bench_pipeline [--scale 1,4,16] [--queries 20] [--out results.json]
+"""
+import os
+import sys
+import json
+import glob
+import time
+import platform
+import resource
+import argparse
+import threading
+import subprocess
+
+from src import settings
+from src.batch_qa import LocalFile
+from src.load_chunks import loadfile, docs_to_chunks
+from src.vectorstore import get_embeddings, build_vectorstore, make_retriever
+from src.configchat import config_conversation
+from src.tracing import SessionTrace, session_trace
+
+QUESTIONS = [
+    "What is the main contribution of the paper?",
+    "Which datasets are used in the experiments?",
+    "How is the model evaluated?",
+    "What are the limitations discussed by the authors?",
+    "How are missing values handled?",
+]
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        ## ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Stage:
+    ## Times a block and samples RSS in the background to get the stage's peak
+    def __init__(self, results, corpus, name, interval=0.01, spans=()):
+        ## `spans`: app stages recorded inside the block, reported as their own rows (default: the block itself)
+        self.results = results
+        self.corpus = corpus
+        self.name = name
+        self.interval = interval
+        self.spans = spans
+        self.items = 0
+        self.trace = SessionTrace(max_spans=10**6)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._traced = session_trace(self.trace)
+        self._traced.__enter__()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self._traced.__exit__(*exc)
+        self._done.set()
+        self._sampler.join()
+        self.peak = max(self.peak, current_rss())
+        totals = self.trace.totals()
+        for name in self.spans or (self.name,):
+            self.row(name, totals.get(name, 0.0) if self.spans else seconds)
+        return False
+
+    def row(self, name, seconds):
+        self.results.append({
+            "corpus": self.corpus,
+            "stage": name,
+            "seconds": round(seconds, 4),
+            "peak_rss_mb": round(self.peak / 2**20, 1),
+            "items": self.items,
+            "items_per_sec": round(self.items / seconds, 2) if seconds else None,
+        })
+
+
+def scaled_pages(pages, scale):
+    ## Synthetic bigger corpus: the sample pages repeated under new file names
+    if scale == 1:
+        return pages
+    scaled = []
+    for copy in range(scale):
+        for page in pages:
+            metadata = dict(page.metadata, source=f"copy{copy}-{page.metadata['source']}")
+            scaled.append(page.model_copy(update={"metadata": metadata}))
+    return scaled
+
+
+def run_corpus(results, files, scale, queries):
+    corpus = f"sample x{scale}"
+    with Stage(results, corpus, "extract") as stage:
+        pages = scaled_pages(loadfile(files), scale)
+        stage.items = len(pages)
+    with Stage(results, corpus, "split") as stage:
+        chunks = docs_to_chunks(pages)
+        stage.items = len(chunks)
+
+    model_embed = get_embeddings()
+    ## Batches are embedded and added (vectors + BM25) as the app does, index type chosen from the chunk count
+    with Stage(results, corpus, "build", spans=("embed", "index")) as stage:
+        vectordb = build_vectorstore(chunks, model_embed)
+        stage.items = len(chunks)
+
+    ## As configured: DOCHAT_RETRIEVAL_MODE (hybrid/dense) + DOCHAT_RERANK_ENABLED
+    retriever = make_retriever(vectordb)
+    questions = [QUESTIONS[i % len(QUESTIONS)] for i in range(queries)]
+    with Stage(results, corpus, "retrieve") as stage:
+        for question in questions:
+            retriever.invoke(question)
+        stage.items = len(questions)
+    if settings.RERANK_ENABLED:
+        ## (re-rank time is part of the retrieve row above)
+        stage.row("rerank", stage.trace.totals().get("rerank", 0.0))
+    with Stage(results, corpus, "generate") as stage:
+        for question in questions:
+            ## Fresh chain per question (no answer-cache corpus id) so every turn runs the full chain
+            chain = config_conversation("Fake", None, retriever, "Meta - Llama3")
+            chain({"question": question})
+        stage.items = len(questions)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default="sample")
+    parser.add_argument("--scale", default="1,4", help="comma separated corpus multipliers")
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--out", default=None, help="write machine-readable results (JSON) here")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not paths:
+        raise SystemExit(f"No PDFs found in {args.pdf_dir}")
+    files = [LocalFile(path) for path in paths]
+
+    results = []
+    for scale in (int(value) for value in args.scale.split(",")):
+        run_corpus(results, files, scale, args.queries)
+
+    print(f"{'corpus':<12}{'stage':<10}{'seconds':>10}{'peak MB':>10}{'items':>8}{'items/s':>10}")
+    for row in results:
+        print(f"{row['corpus']:<12}{row['stage']:<10}{row['seconds']:>10.3f}{row['peak_rss_mb']:>10.1f}"
+              f"{row['items']:>8}{row['items_per_sec'] or 0:>10.1f}")
+
+    if args.out:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "settings": settings.index_params(),
+            "retrieval": {"mode": settings.RETRIEVAL_MODE, "rerank": bool(settings.RERANK_ENABLED)},
+            "results": results,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
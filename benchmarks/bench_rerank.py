@@ -0,0 +1,75 @@
+"""Cross-encoder re-rank latency per query on the sample PDFs, cold (model scores every pair) vs warm (memoized pairs).
+
+Run: python -m benchmarks.bench_rerank [--candidates 20] [--batch-size 32] [--repeat 3]
+"""
+import os
+import glob
+import time
+import argparse
+import statistics
+
+from src.batch_qa import LocalFile
+from src.pipeline import acquire_index
+from src.vectorstore import get_cross_encoder, score_pairs, PairScoreCache
+
+QUESTIONS = [
+    "What is the main contribution of the paper?",
+    "How is multi-head attention computed?",
+    "Which datasets are used in the experiments?",
+    "How does the model handle long audio inputs?",
+    "What are the limitations discussed by the authors?",
+    "How are missing values handled?",
+    "What is multiple imputation?",
+    "Which optimizer and learning rate schedule are used?",
+]
+
+
+def percentiles(values):
+    values = sorted(values)
+    return statistics.median(values), values[int(0.95 * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", default="sample")
+    parser.add_argument("--candidates", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = [LocalFile(path) for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))]
+    if not files:
+        raise SystemExit(f"No PDFs found in {args.pdf_dir}")
+    first_stage = acquire_index(files).as_retriever(args.candidates, rerank=False)
+
+    ## Model load is a one-off per process, kept out of the per-query numbers
+    start = time.perf_counter()
+    model = get_cross_encoder()
+    model.predict([("warm up", "warm up")], show_progress_bar=False)
+    print(f"cross-encoder load: {time.perf_counter() - start:.2f}s")
+
+    candidates = {question: first_stage.invoke(question) for question in QUESTIONS}
+    retrieve, cold, warm = [], [], []
+    for _ in range(args.repeat):
+        cache = PairScoreCache(max_entries=100000) ## fresh per repeat: the first pass is cold again
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            first_stage.invoke(question)
+            retrieve.append(time.perf_counter() - start)
+            texts = [doc.page_content for doc in candidates[question]]
+            for timings in (cold, warm):
+                start = time.perf_counter()
+                score_pairs(question, texts, args.batch_size, model, cache)
+                timings.append(time.perf_counter() - start)
+
+    pairs = statistics.mean(len(docs) for docs in candidates.values())
+    print(f"{len(QUESTIONS)} questions x {args.repeat}, {pairs:.0f} candidates/query, batch {args.batch_size}")
+    print(f"{'stage':<22}{'p50 ms':>9}{'p95 ms':>9}")
+    for name, timings in (("first stage", retrieve), ("rerank cold", cold), ("rerank warm (memoized)", warm)):
+        p50, p95 = percentiles(timings)
+        print(f"{name:<22}{p50 * 1000:>9.1f}{p95 * 1000:>9.1f}")
+    print(f"cold rerank per pair: {statistics.median(cold) / pairs * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
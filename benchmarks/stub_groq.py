@@ -0,0 +1,117 @@
+"""Local stand-in for the Groq chat completions API (OpenAI-compatible, streaming and non-streaming).
+
+Run:  python -m benchmarks.stub_groq --port 8900 [--latency 0.2] [--token-delay 0.01]
+Then: DOCHAT_GROQ_BASE_URL=http://127.0.0.1:8900 streamlit run DoChatBot.py   (any API key works)
+
+Answers are deterministic: a fixed sentence that quotes the start of the last user message.
+"""
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+def stub_answer(messages):
+    question = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    return f"Stub answer for: {' '.join(question.split()[:12])}"
+
+
+class StubGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" ## keep-alive, so client connection pooling is exercised
+    latency = 0.0
+    token_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") != COMPLETIONS_PATH:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        time.sleep(self.latency)
+        model = request.get("model", "stub")
+        answer = stub_answer(request.get("messages", []))
+        words = answer.split(" ")
+        usage = {
+            "prompt_tokens": sum(len(m.get("content", "").split()) for m in request.get("messages", [])),
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not request.get("stream"):
+            self._json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            time.sleep(self.token_delay)
+            delta = {"role": "assistant", "content": word if i == 0 else " " + word}
+            send(json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }))
+        send(json.dumps({
+            "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "x_groq": {"usage": usage},
+        }))
+        send("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(port=0, latency=0.0, token_delay=0.0, host="127.0.0.1"):
+    ## Serves from a daemon thread, returns (server, base_url); port=0 picks a free port
+    handler = type("ConfiguredStubGroqHandler", (StubGroqHandler,), {"latency": latency, "token_delay": token_delay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-groq", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    args = parser.parse_args()
+    server, url = start_stub_server(args.port, args.latency, args.token_delay)
+    print(f"Stub Groq API on {url}{COMPLETIONS_PATH} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+## Semantic answer cache: near-duplicate questions on the same corpus reuse the previous answer
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import numpy as np
+
+from src import settings
+from src.tracing import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    corpus_id: str
+    question: str
+    vector: np.ndarray
+    answer: str
+    sources: list = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Entries are keyed by (corpus fingerprint + backend/model, standalone question) and matched by cosine similarity
+    of the question embedding. TTL + LRU eviction, optional write-through pickle files in `path`.
+    """
+
+    def __init__(self, embed_query, threshold=0.95, ttl=86400, max_entries=512, path=None):
+        self.embed_query = embed_query
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            self._load_disk()
+
+    @staticmethod
+    def _key(corpus_id, question):
+        return hashlib.sha256(f"{corpus_id}\0{question.strip().lower()}".encode()).hexdigest()
+
+    def embed(self, question):
+        return _normalize(self.embed_query(question))
+
+    def _expired(self, entry, now):
+        return self.ttl and now - entry.created > self.ttl
+
+    def lookup(self, corpus_id, vector):
+        now = time.time()
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if self._expired(entry, now)]:
+                self._drop(key)
+            candidates = [(key, entry) for key, entry in self._entries.items() if entry.corpus_id == corpus_id]
+            if candidates:
+                scores = np.stack([entry.vector for _, entry in candidates]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    record_cache("answer", True)
+                    return entry
+            self.misses += 1
+            record_cache("answer", False)
+            return None
+
+    def store(self, corpus_id, question, vector, answer, sources):
+        entry = CachedAnswer(corpus_id, question, vector, answer, list(sources))
+        key = self._key(corpus_id, question)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+        if self.path:
+            self._write_disk(key, entry)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        if self.path:
+            try:
+                os.remove(os.path.join(self.path, f"{key}.pkl"))
+            except OSError:
+                pass
+
+    def _write_disk(self, key, entry):
+        tmp_path = os.path.join(self.path, f"{key}.pkl.tmp-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f)
+        os.replace(tmp_path, os.path.join(self.path, f"{key}.pkl"))
+
+    def _load_disk(self):
+        now = time.time()
+        loaded = []
+        for name in os.listdir(self.path):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                with open(os.path.join(self.path, name), "rb") as f:
+                    entry = pickle.load(f)
+            except Exception:
+                logger.warning("Skipping unreadable answer cache entry %s", name)
+                continue
+            if not self._expired(entry, now):
+                loaded.append((entry.created, name[:-len(".pkl")], entry))
+        for _, key, entry in sorted(loaded, key=lambda item: item[0])[-self.max_entries:]:
+            self._entries[key] = entry
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    ## Process-wide cache shared by every session (None when disabled)
+    global _cache
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from src.vectorstore import get_embeddings
+            _cache = SemanticAnswerCache(
+                get_embeddings().embed_query,
+                threshold=settings.ANSWER_CACHE_THRESHOLD,
+                ttl=settings.ANSWER_CACHE_TTL,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+                path=settings.ANSWER_CACHE_DIR or None,
+            )
+        return _cache
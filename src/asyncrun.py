@@ -0,0 +1,67 @@
+## One background asyncio loop per process for the async chain path (Streamlit script threads stay synchronous)
+import queue
+import asyncio
+import threading
+
+from src import settings
+from src.callbacks import TokenQueueHandler
+from src.tracing import session_trace
+
+
+class Overloaded(RuntimeError):
+    ## Too many chat turns already waiting for a slot
+    pass
+
+
+_loop = None
+_semaphore = None
+_pending = 0
+_lock = threading.Lock()
+
+
+def get_loop():
+    global _loop, _semaphore
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _semaphore = asyncio.Semaphore(settings.LLM_CONCURRENCY)
+            threading.Thread(target=_loop.run_forever, name="dochat-async", daemon=True).start()
+        return _loop
+
+
+async def _bounded(coro, trace):
+    ## Backpressure: at most LLM_CONCURRENCY turns in flight, at most LLM_MAX_PENDING waiting
+    global _pending
+    with _lock:
+        if _pending >= settings.LLM_MAX_PENDING:
+            coro.close()
+            raise Overloaded("Too many questions in flight, please retry in a moment")
+        _pending += 1
+    try:
+        async with _semaphore:
+            with session_trace(trace):
+                return await coro
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def submit(coro, trace=None):
+    ## -> concurrent.futures.Future, usable from any thread
+    loop = get_loop()
+    return asyncio.run_coroutine_threadsafe(_bounded(coro, trace), loop)
+
+
+def stream_answer(chain, inputs, on_token, callbacks=(), trace=None, poll=0.05):
+    ## Runs `chain.ainvoke` on the shared loop and calls `on_token(token)` in the calling (script) thread
+    tokens = queue.SimpleQueue()
+    config = {"callbacks": [TokenQueueHandler(tokens), *callbacks]}
+    future = submit(chain.ainvoke(inputs, config=config), trace)
+    while not future.done():
+        try:
+            on_token(tokens.get(timeout=poll))
+        except queue.Empty:
+            pass
+    while not tokens.empty():
+        on_token(tokens.get_nowait())
+    return future.result()
@@ -0,0 +1,151 @@
+## Pluggable LLM and embedding backends, looked up by name. Provider packages are imported by their factory only.
+import threading
+
+from src import settings
+
+## Model names for each inference provider
+GROQ_MODELS = {
+    'Meta - Llama3': "llama3-8b-8192",
+    'Google - Gemma2': "gemma2-9b-it",
+}
+
+## name -> factory(model_api, model_type, streaming, tags) -> chat model
+LLM_BACKENDS = {}
+## name -> factory() -> LangChain Embeddings
+EMBEDDING_BACKENDS = {}
+## Backends that run without an API key (the UI skips the key prompt)
+KEYLESS_LLM_BACKENDS = set()
+
+
+def llm_backend(name, needs_key=True):
+    def register(factory):
+        LLM_BACKENDS[name] = factory
+        if not needs_key:
+            KEYLESS_LLM_BACKENDS.add(name)
+        return factory
+    return register
+
+
+def embedding_backend(name):
+    def register(factory):
+        EMBEDDING_BACKENDS[name] = factory
+        return factory
+    return register
+
+
+def make_llm(inference, model_api, model_type, streaming=False, tags=None):
+    if inference not in LLM_BACKENDS:
+        raise ValueError(f"Unsupported inference {inference!r}, choose one of {sorted(LLM_BACKENDS)}")
+    return LLM_BACKENDS[inference](model_api, model_type, streaming=streaming, tags=tags)
+
+
+def make_embeddings(backend=None):
+    backend = backend or settings.EMBED_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, choose one of {sorted(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[backend]()
+
+
+def hub_model_name(name):
+    ## "all-MiniLM-L6-v2" -> "sentence-transformers/all-MiniLM-L6-v2" (names with an org are kept)
+    return name if "/" in name else f"sentence-transformers/{name}"
+
+
+## ---------------- LLMs ---------------- ##
+
+@llm_backend('Groq')
+def groq_llm(model_api, model_type, streaming=False, tags=None):
+    from src.llmclients import get_groq_chat
+    model = GROQ_MODELS.get(model_type, "gemma2-9b-it")
+    ## Shared instance + pooled keep-alive connections per API key
+    return get_groq_chat(model_api, model, temperature=0.5, streaming=streaming, tags=tags)
+
+
+@llm_backend('Fake', needs_key=False)
+def fake_llm(model_api, model_type, streaming=False, tags=None):
+    ## Offline, deterministic, no network: load tests and benchmarks measure our own overhead
+    from src.fakes import DeterministicFakeChat
+    return DeterministicFakeChat(
+        streaming=streaming,
+        tags=tags,
+        first_token_latency=settings.FAKE_LLM_LATENCY,
+        token_delay=settings.FAKE_LLM_TOKEN_DELAY,
+    )
+
+
+class _SerializedLlama:
+    ## A llama.cpp context is not thread-safe: one completion at a time per loaded model
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def create_chat_completion(self, *args, stream=False, **kwargs):
+        if stream:
+            return self._stream(*args, **kwargs)
+        with self._lock:
+            return self._client.create_chat_completion(*args, **kwargs)
+
+    def _stream(self, *args, **kwargs):
+        with self._lock:
+            yield from self._client.create_chat_completion(*args, stream=True, **kwargs)
+
+
+_llama = {}
+_llama_lock = threading.Lock()
+
+
+@llm_backend('LlamaCpp', needs_key=False)
+def llamacpp_llm(model_api, model_type, streaming=False, tags=None):
+    ## CPU-local GGUF model: loaded once per path, every chain gets a copy sharing the same weights/context
+    if not settings.LLAMACPP_MODEL_PATH:
+        raise ValueError("Set DOCHAT_LLAMACPP_MODEL_PATH to a GGUF model file to use the LlamaCpp backend")
+    with _llama_lock:
+        base = _llama.get(settings.LLAMACPP_MODEL_PATH)
+        if base is None:
+            from langchain_community.chat_models import ChatLlamaCpp
+            base = ChatLlamaCpp(
+                model_path=settings.LLAMACPP_MODEL_PATH,
+                n_ctx=settings.LLAMACPP_N_CTX,
+                n_threads=settings.LLAMACPP_THREADS,
+                max_tokens=settings.LLAMACPP_MAX_TOKENS,
+                temperature=0.5,
+                verbose=False,
+            )
+            base.client = _SerializedLlama(base.client)
+            _llama[settings.LLAMACPP_MODEL_PATH] = base
+    return base.model_copy(update={"streaming": streaming, "tags": tags})
+
+
+## ---------------- Embeddings ---------------- ##
+
+@embedding_backend("hf")
+def hf_embeddings():
+    ## torch + sentence-transformers are only imported here (seconds of import time)
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    ## All cores for the encoder's matmuls (torch intra-op threads)
+    torch.set_num_threads(settings.EMBED_THREADS)
+    return HuggingFaceEmbeddings(
+        model_name=settings.EMBED_MODEL,
+        encode_kwargs={"batch_size": settings.EMBED_BATCH_SIZE},
+    )
+
+
+@embedding_backend("onnx")
+def onnx_embeddings():
+    ## ONNX Runtime on CPU through fastembed (no torch), same MiniLM weights exported to ONNX
+    from langchain_community.embeddings import FastEmbedEmbeddings
+    return FastEmbedEmbeddings(
+        model_name=hub_model_name(settings.EMBED_MODEL),
+        batch_size=settings.EMBED_BATCH_SIZE,
+        threads=settings.EMBED_THREADS,
+    )
+
+
+@embedding_backend("fake")
+def fake_embeddings():
+    from src.fakes import HashingEmbeddings
+    return HashingEmbeddings(settings.FAKE_EMBED_DIM)
@@ -0,0 +1,126 @@
+"""Headless batch Q&A over a folder of PDFs, one JSON line per answer.
+
+Run:
+    python -m src.batch_qa --pdf-dir reports/ --questions questions.txt --out answers.jsonl
+    python -m src.batch_qa --pdf-dir sample/ --questions questions.txt --fake-llm   (no network)
+
+`--questions` is a text file (one question per line) or JSONL with {"id": ..., "question": ...}.
+`--fake-llm` also switches the embeddings to the offline hashing backend (unless DOCHAT_EMBED_BACKEND is set),
+so nothing is downloaded: no model weights, no tokenizer. `sources` lists each (file, 1-based page) once.
+"""
+import io
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+## App modules are imported in `main`/`answer_one`: settings are read at import time, after --fake-llm is applied
+logger = logging.getLogger(__name__)
+
+
+class LocalFile(io.BytesIO):
+    ## A PDF on disk that looks like a Streamlit UploadedFile (name + getvalue())
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+
+
+def read_questions(path):
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                questions.append((str(record.get("id", number)), record["question"]))
+            else:
+                questions.append((str(number), line))
+    return questions
+
+
+def answer_one(args, retriever, corpus_id, question_id, question):
+    ## One fresh chain per question: no chat history leaks between questions
+    from src.chatlog import source_refs
+    from src.configchat import config_conversation
+
+    start = time.perf_counter()
+    record = {"id": question_id, "question": question}
+    try:
+        chain = config_conversation(args.inference, args.api_key, retriever, args.model, corpus_id=corpus_id)
+        response = chain({"question": question})
+        record["answer"] = response["answer"]
+        record["sources"] = source_refs(response.get("source_documents", []))
+    except Exception as e:
+        logger.exception("Question %s failed", question_id)
+        record["error"] = f"{type(e).__name__}: {e}"
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--fake-llm" in argv:
+        ## Fully offline: before src.settings is imported
+        os.environ.setdefault("DOCHAT_EMBED_BACKEND", "fake")
+    from src.load_chunks import loadfile, docs_to_chunks
+    from src.vectorstore import config_retriever
+    from src.backends import GROQ_MODELS, LLM_BACKENDS, KEYLESS_LLM_BACKENDS
+    from src.indexcache import corpus_key
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf-dir", required=True)
+    parser.add_argument("--questions", required=True)
+    parser.add_argument("--out", default="-", help="JSONL output file ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight against the LLM")
+    parser.add_argument("--inference", default="Groq", choices=sorted(LLM_BACKENDS))
+    parser.add_argument("--model", default="Meta - Llama3", choices=sorted(GROQ_MODELS))
+    parser.add_argument("--api-key", default=os.getenv("GROQ_API_KEY"))
+    parser.add_argument("--fake-llm", action="store_true", help="offline fake LLM + hashing embeddings, no network or API key")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.fake_llm:
+        args.inference = "Fake"
+    elif not args.api_key and args.inference not in KEYLESS_LLM_BACKENDS:
+        parser.error(f"--api-key (or GROQ_API_KEY) is required for {args.inference} unless --fake-llm is set")
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if not paths:
+        parser.error(f"no PDFs found in {args.pdf_dir}")
+    questions = read_questions(args.questions)
+
+    ## Ingest once
+    start = time.perf_counter()
+    files = [LocalFile(path) for path in paths]
+    documents = docs_to_chunks(loadfile(files))
+    retriever = config_retriever(documents)
+    corpus_id = corpus_key(files)
+    logger.info("Ingested %d PDFs into %d chunks in %.1fs", len(files), len(documents), time.perf_counter() - start)
+
+    ## Bounded concurrency, answers written in question order as they complete
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    start = time.perf_counter()
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            records = pool.map(lambda item: answer_one(args, retriever, corpus_id, *item), questions)
+            for record in records:
+                failed += "error" in record
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logger.info("Answered %d questions (%d failed) in %.1fs", len(questions), failed, time.perf_counter() - start)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+## LangChain callback handlers used by the Streamlit app
+import time
+from abc import ABC, abstractmethod
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.tokens import count_tokens
+from src.tracing import current_trace, session_trace, record_span, record_tokens, record_error
+
+## Tag carried by the LLM that rewrites follow-ups into standalone questions
+CONDENSE_TAG = "condense_question"
+
+
+class AnswerTokenHandler(BaseCallbackHandler, ABC):
+    ## Passes answer tokens to `on_answer_token`, skipping the standalone-question rewrite
+    def __init__(self):
+        self.run_ids_ignore_token = set()
+
+    def _ignore_condense(self, run_id, tags):
+        # Prevent showing the rephrased question as output
+        if tags and CONDENSE_TAG in tags:
+            self.run_ids_ignore_token.add(run_id)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        self._ignore_condense(run_id, tags)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        self._ignore_condense(run_id, tags)
+
+    def on_llm_new_token(self, token, *, run_id=None, **kwargs):
+        # Handle the new token generated by the LLM
+        if run_id in self.run_ids_ignore_token:
+            return
+        self.on_answer_token(token)
+
+    @abstractmethod
+    def on_answer_token(self, token):
+        ...
+
+
+class StreamHandler(AnswerTokenHandler):
+    ## Writes answer tokens into a Streamlit container as they arrive, redrawn at most every `min_interval` seconds
+    def __init__(self, container, initial_text="", min_interval=0.05):
+        super().__init__()
+        self.container = container
+        self.text = initial_text
+        self.min_interval = min_interval
+        self._drawn_at = 0.0
+
+    def on_answer_token(self, token):
+        self.text += token
+        now = time.monotonic()
+        if now - self._drawn_at >= self.min_interval:
+            self.container.markdown(self.text + "▌")
+            self._drawn_at = now
+
+    def finish(self, answer):
+        ## Final render without the cursor (also covers answers that did not stream)
+        self.text = self.text or answer
+        self.container.markdown(self.text)
+
+
+class TokenQueueHandler(AnswerTokenHandler):
+    ## For runs on another thread/event loop: tokens go through a queue, the script thread renders them
+    def __init__(self, tokens):
+        super().__init__()
+        self.tokens = tokens
+
+    def on_answer_token(self, token):
+        self.tokens.put(token)
+
+
+class TracingHandler(BaseCallbackHandler):
+    ## condense / retrieve / generate spans and token counts from LangChain callbacks
+    def __init__(self, trace=None):
+        self.trace = trace
+        self._runs = {}
+
+    def _start(self, run_id, stage, prompt_tokens=0):
+        self._runs[run_id] = (stage, time.perf_counter(), prompt_tokens)
+
+    def _end(self, run_id):
+        stage, start, prompt_tokens = self._runs.pop(run_id, (None, None, 0))
+        if stage is not None:
+            with session_trace(self.trace or current_trace()):
+                record_span(stage, time.perf_counter() - start)
+        return stage, prompt_tokens
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+        stage = "condense" if tags and CONDENSE_TAG in tags else "generate"
+        self._start(run_id, stage, sum(count_tokens(m.content) for batch in messages for m in batch))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs):
+        stage = "condense" if tags and CONDENSE_TAG in tags else "generate"
+        self._start(run_id, stage, sum(count_tokens(prompt) for prompt in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        stage, estimated_prompt = self._end(run_id)
+        if stage is None:
+            return
+        ## Provider usage when reported (non-streaming Groq), local estimate otherwise
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens") or estimated_prompt
+        completion_tokens = usage.get("completion_tokens") or sum(
+            count_tokens(generation.text) for generations in response.generations for generation in generations
+        )
+        with session_trace(self.trace or current_trace()):
+            record_tokens("prompt", prompt_tokens, stage)
+            record_tokens("completion", completion_tokens, stage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+        record_error("llm")
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "retrieve")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+        record_error("retriever")
@@ -0,0 +1,150 @@
+## Chains used by the app
+import asyncio
+from typing import Optional
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.base import Chain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from pydantic import ConfigDict
+
+from src.rewrite import RewriteGate
+from src.answercache import SemanticAnswerCache
+from src.context import pack_documents
+
+
+class GatedQuestionGenerator(Chain):
+    ## Wraps the condense-question LLMChain, returns the question untouched when the gate says it stands alone
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    llm_chain: Chain
+    gate: RewriteGate
+    output_key: str = "text"
+
+    @property
+    def input_keys(self):
+        return ["question", "chat_history"]
+
+    @property
+    def output_keys(self):
+        return [self.output_key]
+
+    def _call(self, inputs, run_manager=None):
+        if not self.gate.check(inputs["question"], inputs["chat_history"]):
+            return {self.output_key: inputs["question"]}
+        callbacks = run_manager.get_child() if run_manager else None
+        return {self.output_key: self.llm_chain.run(callbacks=callbacks, **inputs)}
+
+    async def _acall(self, inputs, run_manager=None):
+        if not self.gate.check(inputs["question"], inputs["chat_history"]):
+            return {self.output_key: inputs["question"]}
+        callbacks = run_manager.get_child() if run_manager else None
+        return {self.output_key: await self.llm_chain.arun(callbacks=callbacks, **inputs)}
+
+
+class DocChatChain(ConversationalRetrievalChain):
+    ## ConversationalRetrievalChain + semantic answer cache between the question rewrite and retrieval
+    ## + token-budgeted packing of the retrieved chunks
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    answer_cache: Optional[SemanticAnswerCache] = None
+    corpus_id: Optional[str] = None
+    context_token_budget: Optional[int] = None
+
+    def _prepare_docs(self, docs):
+        if self.context_token_budget:
+            ## Merge overlapping neighbours, keep the best blocks that fit
+            return pack_documents(docs, self.context_token_budget)
+        return self._reduce_tokens_below_limit(docs)
+
+    def _get_docs(self, question, inputs, *, run_manager):
+        docs = self.retriever.invoke(question, config={"callbacks": run_manager.get_child()})
+        return self._prepare_docs(docs)
+
+    async def _aget_docs(self, question, inputs, *, run_manager):
+        docs = await self.retriever.ainvoke(question, config={"callbacks": run_manager.get_child()})
+        return self._prepare_docs(docs)
+
+    def _output(self, answer, docs, new_question):
+        output = {self.output_key: answer}
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = new_question
+        return output
+
+    def _call(self, inputs, run_manager=None):
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        if chat_history_str:
+            new_question = self.question_generator.run(
+                question=question, chat_history=chat_history_str, callbacks=_run_manager.get_child()
+            )
+        else:
+            new_question = question
+
+        ## Near-duplicate standalone question on the same corpus -> cached answer + sources
+        vector = None
+        if self.answer_cache is not None and self.corpus_id:
+            vector = self.answer_cache.embed(new_question)
+            hit = self.answer_cache.lookup(self.corpus_id, vector)
+            if hit is not None:
+                return self._output(hit.answer, hit.sources, new_question)
+
+        docs = self._get_docs(new_question, inputs, run_manager=_run_manager)
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self._output(self.response_if_no_docs_found, docs, new_question)
+
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        answer = self.combine_docs_chain.run(input_documents=docs, callbacks=_run_manager.get_child(), **new_inputs)
+        if vector is not None:
+            self.answer_cache.store(self.corpus_id, new_question, vector, answer, docs)
+        return self._output(answer, docs, new_question)
+
+    async def _acall(self, inputs, run_manager=None):
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        ## Retrieval for the question as asked starts right away, concurrently with the history rewrite
+        docs_task = asyncio.ensure_future(self._aget_docs(question, inputs, run_manager=_run_manager))
+        if chat_history_str:
+            new_question = await self.question_generator.arun(
+                question=question, chat_history=chat_history_str, callbacks=_run_manager.get_child()
+            )
+        else:
+            new_question = question
+        if new_question.strip() != question.strip():
+            ## The rewrite changed the question: the speculative results are not the right ones
+            docs_task.cancel()
+            docs_task = asyncio.ensure_future(self._aget_docs(new_question, inputs, run_manager=_run_manager))
+
+        ## Answer-cache embedding runs while retrieval is in flight
+        vector = None
+        if self.answer_cache is not None and self.corpus_id:
+            vector = await asyncio.to_thread(self.answer_cache.embed, new_question)
+            hit = self.answer_cache.lookup(self.corpus_id, vector)
+            if hit is not None:
+                docs_task.cancel()
+                return self._output(hit.answer, hit.sources, new_question)
+
+        docs = await docs_task
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            return self._output(self.response_if_no_docs_found, docs, new_question)
+
+        new_inputs = inputs.copy()
+        if self.rephrase_question:
+            new_inputs["question"] = new_question
+        new_inputs["chat_history"] = chat_history_str
+        answer = await self.combine_docs_chain.arun(
+            input_documents=docs, callbacks=_run_manager.get_child(), **new_inputs
+        )
+        if vector is not None:
+            self.answer_cache.store(self.corpus_id, new_question, vector, answer, docs)
+        return self._output(answer, docs, new_question)
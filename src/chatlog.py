@@ -0,0 +1,66 @@
+## Typed chat transcript kept in session state, the UI renders from here (not from the chain's chat_history)
+import os
+import time
+from dataclasses import dataclass, field
+
+USER = "user"
+ASSISTANT = "assistant"
+
+
+@dataclass
+class ChatMessage:
+    role: str
+    content: str
+    sources: list = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+
+
+def source_refs(docs):
+    ## Unique (file, page) of the retrieved chunks, in rank order (pages 1-based)
+    refs = []
+    for doc in docs:
+        ref = {"source": os.path.basename(str(doc.metadata.get("source"))), "page": doc.metadata.get("page", 0) + 1}
+        if ref not in refs:
+            refs.append(ref)
+    return refs
+
+
+class ChatLog:
+    """
+    Append-only list of ChatMessage. Only the latest `visible` messages are drawn as chat bubbles on a rerun,
+    older ones are reachable one page at a time, so a rerun draws a bounded number of elements.
+    """
+
+    def __init__(self, visible=20, page_size=20):
+        self.visible = visible
+        self.page_size = page_size
+        self.messages = []
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, role, content, sources=None):
+        message = ChatMessage(role, content, list(sources or []))
+        self.messages.append(message)
+        return message
+
+    def clear(self):
+        self.messages.clear()
+
+    def recent(self):
+        ## Keeps a user question together with its answer at the window edge
+        start = max(0, len(self.messages) - self.visible)
+        if start and self.messages[start].role == ASSISTANT:
+            start -= 1
+        return self.messages[start:]
+
+    def n_older(self):
+        return len(self.messages) - len(self.recent())
+
+    def n_pages(self):
+        return -(-self.n_older() // self.page_size)
+
+    def page(self, number):
+        ## Older messages, page 1 = the ones just before the visible window
+        end = self.n_older() - (number - 1) * self.page_size
+        return self.messages[max(0, end - self.page_size):max(0, end)]
@@ -0,0 +1,242 @@
+## Structure-aware chunker: headings / paragraphs / tables / sentences, sized in embedding-model tokens
+import re
+import logging
+import threading
+from langchain_core.documents import Document
+
+from src import settings
+from src.backends import hub_model_name
+from src.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+HEADING, PARAGRAPH, TABLE = "heading", "paragraph", "table"
+
+_LINE_RE = re.compile(r"[^\n]*\n?")
+_WORD_RE = re.compile(r"\S+")
+## Sentence end: punctuation (+ closing quotes/brackets) followed by whitespace and an upper-case/digit start
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*(?=\s+[\"(\[]?[A-Z0-9])")
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+[A-Z]")
+## Whitespace-delimited numeric cells, counted with one scan of the line
+_NUMBER_RE = re.compile(r"(?<!\S)[-+±]?[\d.,%]+(?!\S)")
+_DIGIT_RE = re.compile(r"\d")
+_SPACE_RE = re.compile(r"\s*")
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_token_counter():
+    """
+    texts -> token counts, in one call per page. DOCHAT_CHUNK_TOKENIZER="model" uses the embedding model's
+    own (Rust, batched) tokenizer, falls back to the local estimate when it cannot be loaded.
+    """
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = _estimate_counter
+            ## (the fake embedder has no tokenizer: it stays offline)
+            if settings.CHUNK_TOKENIZER == "model" and settings.EMBED_BACKEND != "fake":
+                try:
+                    from tokenizers import Tokenizer
+                    tokenizer = Tokenizer.from_pretrained(hub_model_name(settings.EMBED_MODEL))
+                    tokenizer.no_truncation()
+                    tokenizer.no_padding()
+                    ## (the "fast" variant skips the character offsets, which are not needed for counting)
+                    encode = getattr(tokenizer, "encode_batch_fast", tokenizer.encode_batch)
+                    _counter = lambda texts: [len(e.ids) for e in encode(texts, add_special_tokens=False)]
+                except Exception:
+                    logger.warning("Tokenizer of %s unavailable, sizing chunks with the local estimate", settings.EMBED_MODEL, exc_info=True)
+        return _counter
+
+
+def _estimate_counter(texts):
+    return [count_tokens(text) for text in texts]
+
+
+def _is_heading(line):
+    if not 2 <= len(line) <= 80 or line[-1] in ".,;" or not any(c.isalpha() for c in line):
+        return False
+    if _NUMBERED_HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if len(letters) >= 4 and all(c.isupper() for c in letters):
+        return True
+    words = line.split()
+    return line[0].isupper() and len(words) <= 8 and all(w[0].isupper() or not w[0].isalpha() or len(w) <= 3 for w in words)
+
+
+def _is_tabular(line):
+    ## Cells come out of PDF text as short numeric runs ("28.4", "0.93  1.2  3.4")
+    if not _DIGIT_RE.search(line):
+        return False
+    return len(_NUMBER_RE.findall(line)) * 2 >= len(line.split())
+
+
+def _blocks(text):
+    """
+    (kind, start, end) spans of the page. Paragraphs end at blank lines, headings, tables and
+    short lines that close a sentence, consecutive numeric lines form one table.
+    """
+    lines, pos = [], 0
+    for raw in text.split("\n"):
+        end = min(pos + len(raw) + 1, len(text))
+        if end > pos:
+            lines.append((pos, end, raw.strip()))
+        pos = end
+    numeric = [_is_tabular(line) for _, _, line in lines]
+    lengths = sorted(len(line) for _, _, line in lines if line)
+    typical = lengths[len(lengths) // 2] if lengths else 0
+
+    blocks = []
+    kind, start, end = None, 0, 0
+
+    def close():
+        if kind is not None:
+            blocks.append((kind, start, end))
+
+    for i, (line_start, line_end, line) in enumerate(lines):
+        if not line:
+            close()
+            kind = None
+            continue
+        tabular = numeric[i] and ((i > 0 and numeric[i - 1]) or (i + 1 < len(lines) and numeric[i + 1]))
+        line_kind = TABLE if tabular else HEADING if kind != PARAGRAPH and _is_heading(line) else PARAGRAPH
+        if line_kind == HEADING or line_kind != kind:
+            close()
+            kind, start = line_kind, line_start
+        end = line_start + len(text[line_start:line_end].rstrip())
+        if line_kind == HEADING or (line_kind == PARAGRAPH and line[-1] in ".!?:" and len(line) < 0.7 * typical):
+            close()
+            kind = None
+    close()
+    return blocks
+
+
+def _units(text, blocks):
+    ## Smallest pieces a chunk boundary may fall between: (start, end, kind, block, section)
+    units = []
+    section = ""
+    for block, (kind, start, end) in enumerate(blocks):
+        if kind == HEADING:
+            section = " ".join(text[start:end].split())
+            units.append((start, end, kind, block, section))
+        elif kind == TABLE:
+            for m in _LINE_RE.finditer(text, start, end):
+                row = text[m.start():m.end()].rstrip()
+                if row.strip():
+                    units.append((m.start(), m.start() + len(row), kind, block, section))
+        else:
+            sentence_start = start
+            for m in _SENTENCE_END_RE.finditer(text, start, end):
+                units.append((sentence_start, m.end(), kind, block, section))
+                sentence_start = _SPACE_RE.match(text, m.end()).end()
+            if sentence_start < end:
+                units.append((sentence_start, end, kind, block, section))
+    return units
+
+
+class StructuredChunker:
+    """
+    Drop-in for `RecursiveCharacterTextSplitter.split_documents` (same `start_index` metadata, one page in -> its chunks out).
+    Chunks never cut a sentence (unless a single sentence is over budget), start a new chunk at a heading,
+    keep a table in one chunk when it fits, and only overlap inside a paragraph/table that spans two chunks.
+    `section` metadata holds the latest heading.
+    """
+
+    def __init__(self, chunk_tokens=None, overlap_tokens=None, counter=None):
+        self.chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else settings.CHUNK_OVERLAP_TOKENS
+        self.min_tokens = self.chunk_tokens // 4 ## a heading/table only closes a chunk holding at least this much
+        self.counter = counter or get_token_counter()
+
+    def split_text_spans(self, text):
+        ## [(start, end, section)] of the chunks of one page
+        units = _units(text, _blocks(text))
+        if not units:
+            return []
+        tokens = self.counter([text[start:end] for start, end, *_ in units])
+        units, tokens = self._split_oversized(text, units, tokens)
+
+        block_tokens = {}
+        for unit, count in zip(units, tokens):
+            block_tokens[unit[3]] = block_tokens.get(unit[3], 0) + count
+
+        chunks, current, used = [], [], 0
+        for i, (unit, count) in enumerate(zip(units, tokens)):
+            kind, block = unit[2], unit[3]
+            new_block = not current or units[current[-1]][3] != block
+            carry = []
+            if current and kind == HEADING and used >= self.min_tokens:
+                pass ## headings open a chunk
+            elif current and new_block and kind == TABLE and block_tokens[block] <= self.chunk_tokens < used + block_tokens[block] and used >= self.min_tokens:
+                pass ## a table that fits on its own is not split across chunks
+            elif current and used + count > self.chunk_tokens:
+                if not new_block:
+                    carry = self._overlap(units, current, tokens, count)
+            else:
+                current.append(i)
+                used += count
+                continue
+            ## Trailing headings belong to what follows them
+            moved = []
+            while current and units[current[-1]][2] == HEADING and tokens[current[-1]] + count <= self.chunk_tokens:
+                count += tokens[current[-1]]
+                moved.insert(0, current.pop())
+            if current:
+                chunks.append(current)
+            current = moved + carry + [i]
+            used = sum(tokens[j] for j in current)
+        if current:
+            chunks.append(current)
+        return [(units[c[0]][0], units[c[-1]][1], units[c[0]][4]) for c in chunks]
+
+    def _overlap(self, units, current, tokens, next_count):
+        ## Trailing units (same block) of the chunk being closed, repeated at the start of the next one
+        block = units[current[-1]][3]
+        carry, used = [], 0
+        for j in reversed(current[1:]):
+            if units[j][3] != block or used + tokens[j] > self.overlap_tokens or used + tokens[j] + next_count > self.chunk_tokens:
+                break
+            carry.insert(0, j)
+            used += tokens[j]
+        return carry
+
+    def _split_oversized(self, text, units, tokens):
+        ## A unit over the budget (run-on sentence, extraction without punctuation) is cut between words,
+        ## into pieces of 90% of the budget so a heading still fits in front of the first one
+        if all(count <= self.chunk_tokens for count in tokens):
+            return units, tokens
+        out_units, out_tokens = [], []
+        for unit, count in zip(units, tokens):
+            if count <= self.chunk_tokens:
+                out_units.append(unit)
+                out_tokens.append(count)
+                continue
+            start, end, kind, block, section = unit
+            words = [(m.start(), m.end()) for m in _WORD_RE.finditer(text, start, end)]
+            word_tokens = self.counter([text[a:b] for a, b in words])
+            piece_start, piece_end, used = None, None, 0
+            for (a, b), n in zip(words, word_tokens):
+                if piece_start is not None and used + n > self.chunk_tokens * 0.9:
+                    out_units.append((piece_start, piece_end, kind, block, section))
+                    out_tokens.append(used)
+                    piece_start, used = None, 0
+                if piece_start is None:
+                    piece_start = a
+                piece_end = b
+                used += n
+            if piece_start is not None:
+                out_units.append((piece_start, piece_end, kind, block, section))
+                out_tokens.append(used)
+        return out_units, out_tokens
+
+    def iter_split(self, documents):
+        ## Lazy: chunks of a page are yielded before the next page is read
+        for doc in documents:
+            for start, end, section in self.split_text_spans(doc.page_content):
+                metadata = dict(doc.metadata, start_index=start, section=section)
+                yield Document(page_content=doc.page_content[start:end], metadata=metadata)
+
+    def split_documents(self, documents):
+        return list(self.iter_split(documents))
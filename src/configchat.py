@@ -1,19 +1,43 @@
 import os
-import streamlit as st
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder, HumanMessagePromptTemplate, SystemMessagePromptTemplate
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain.chains import ConversationalRetrievalChain
+from langchain_core.messages import get_buffer_string
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
 from langchain.memory import ConversationBufferMemory
 
+from src import settings
+from src.callbacks import CONDENSE_TAG
+from src.memory import TokenBudgetMemory
+from src.rewrite import RewriteGate
+from src.chain import DocChatChain, GatedQuestionGenerator
+from src.answercache import get_answer_cache
+from src.context import pack_documents
+from src.llmclients import get_groq_chat
+from src.backends import make_llm
+
+
+def gated_history_aware_retriever(llm, retriever, prompt, gate):
+    ## Same contract as create_history_aware_retriever, minus the LLM call for standalone questions
+    rewrite_retriever = prompt | llm | StrOutputParser() | retriever
+    direct_retriever = (lambda inputs: inputs["input"]) | retriever
+
+    def route(inputs):
+        history = get_buffer_string(inputs.get("chat_history") or [])
+        return rewrite_retriever if gate.check(inputs["input"], history) else direct_retriever
+
+    return RunnableLambda(route).with_config(run_name="chat_retriever_chain")
+
 
 # Function for version 0-2
-def build_conversation(model_type, model_api, retriever):
+def build_conversation(model_type, model_api, retriever, gate=None):
+    ## Legacy chain only: providers and chain constructors are imported on use, never at app start
+    from langchain.chains import create_retrieval_chain
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+
     if model_type == 'Groq':
-        llm = ChatGroq(model="mixtral-8x7b-32768", groq_api_key=model_api, temperature=0)
+        llm = get_groq_chat(model_api, "mixtral-8x7b-32768", temperature=0)
     else:
+        from langchain_google_genai import ChatGoogleGenerativeAI
         llm = ChatGoogleGenerativeAI(model="gemini-pro", temperature=0)
     
     contextualize_q_system_prompt ="""
@@ -32,8 +56,13 @@ def build_conversation(model_type, model_api, retriever):
             ]
         )
     
+    ## deduplicate overlapping chunks and pack them up to the token budget
+    if settings.CONTEXT_TOKEN_BUDGET:
+        retriever = retriever | RunnableLambda(lambda docs: pack_documents(docs, settings.CONTEXT_TOKEN_BUDGET))
+
     ## store the retriever with the history inside (context)
-    history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+    ## (skips the rewrite call when the question already stands alone, see `gate.stats()`)
+    history_aware_retriever = gated_history_aware_retriever(llm, retriever, contextualize_q_prompt, gate or RewriteGate())
     
     system_prompt = """
     You are an expert assistant, specialized in understanding PDF documents and answering questions contextually. \
@@ -58,21 +87,41 @@ def build_conversation(model_type, model_api, retriever):
     return rag_chain
     
     
+def make_memory(summary_llm=None):
+    if settings.MEMORY_MODE == "buffer":
+        return ConversationBufferMemory(memory_key = "chat_history", return_messages = True, output_key = "answer")
+    return TokenBudgetMemory(
+        memory_key = "chat_history",
+        return_messages = True,
+        output_key = "answer",
+        max_token_limit = settings.MEMORY_TOKEN_BUDGET,
+        llm = summary_llm if settings.MEMORY_MODE == "summary" else None,
+    )
+
+
 ## Newer config
-def config_conversation(inference, model_api, retriever, model_type):
-    ## Can add any model in it
-    if inference == 'Groq':
-        if model_type == 'Meta - Llama3':
-            llm = ChatGroq(model="llama3-8b-8192", groq_api_key=model_api, temperature=0.5)
-        else:
-            llm = ChatGroq(model="gemma2-9b-it", groq_api_key=model_api, temperature=0.5)
+def config_conversation(inference, model_api, retriever, model_type, corpus_id=None):
+    ## Answer tokens are streamed, the standalone-question rewrite is not (and is tagged so the UI skips it)
+    llm = make_llm(inference, model_api, model_type, streaming=True)
+    condense_llm = make_llm(inference, model_api, model_type, tags=[CONDENSE_TAG])
         
     ## Create a memory and chain
-    memory = ConversationBufferMemory(memory_key = "chat_history", return_messages = True)
-    conversation_chain = ConversationalRetrievalChain.from_llm(
+    memory = make_memory(condense_llm)
+    conversation_chain = DocChatChain.from_llm(
         llm = llm,
         retriever = retriever,
-        memory = memory
+        memory = memory,
+        condense_question_llm = condense_llm,
+        return_source_documents = True,
+        ## Answers are cached per corpus fingerprint (the index cache key) and per backend/model that wrote them
+        answer_cache = get_answer_cache() if corpus_id else None,
+        corpus_id = f"{corpus_id}:{inference}:{model_type}" if corpus_id else None,
+        context_token_budget = settings.CONTEXT_TOKEN_BUDGET or None,
+    )
+    ## Skip the rewrite round trip for standalone questions (counters: `question_generator.gate.stats()`)
+    conversation_chain.question_generator = GatedQuestionGenerator(
+        llm_chain = conversation_chain.question_generator,
+        gate = RewriteGate(),
     )
     
     return conversation_chain
\ No newline at end of file
@@ -0,0 +1,66 @@
+## Packs retrieved chunks into the prompt: merge overlapping neighbours, then fill a token budget by rank
+from langchain_core.documents import Document
+
+from src.tokens import count_tokens
+
+
+def _text_overlap(left, right, max_chars=600):
+    ## Longest suffix of `left` that is a prefix of `right` (chunks without start_index)
+    for size in range(min(len(left), len(right), max_chars), 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge(first, second):
+    ## `second` follows `first` on the same page: append it without the shared overlap text
+    start_a, start_b = first.metadata.get("start_index"), second.metadata.get("start_index")
+    if start_a is not None and start_b is not None:
+        shared = max(0, start_a + len(first.page_content) - start_b)
+        if shared == 0 and start_b > start_a + len(first.page_content):
+            return None ## gap between them, keep separate
+    else:
+        shared = _text_overlap(first.page_content, second.page_content)
+        if not shared:
+            return None
+    metadata = dict(first.metadata, merged=first.metadata.get("merged", 1) + second.metadata.get("merged", 1))
+    return Document(page_content=first.page_content + second.page_content[shared:], metadata=metadata)
+
+
+def merge_neighbours(docs):
+    """
+    docs: best first. Chunks from the same (source, page) that touch or overlap are merged into one block,
+    the block takes the rank of its best chunk. Returns blocks best first.
+    """
+    groups = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("source"), doc.metadata.get("page"))
+        groups.setdefault(key, []).append((rank, doc))
+
+    blocks = []
+    for members in groups.values():
+        members.sort(key=lambda item: item[1].metadata.get("start_index", 0))
+        rank, current = members[0]
+        for next_rank, doc in members[1:]:
+            merged = _merge(current, doc)
+            if merged is None and "start_index" not in doc.metadata:
+                merged = _merge(doc, current) ## no offsets: the order on the page is unknown
+            if merged is None:
+                blocks.append((rank, current))
+                rank, current = next_rank, doc
+            else:
+                rank, current = min(rank, next_rank), merged
+        blocks.append((rank, current))
+    return [doc for _, doc in sorted(blocks, key=lambda item: item[0])]
+
+
+def pack_documents(docs, budget_tokens):
+    ## Deduplicated blocks, best first, as long as they fit in `budget_tokens` (the best one always goes in)
+    packed, used = [], 0
+    for doc in merge_neighbours(docs):
+        tokens = count_tokens(doc.page_content)
+        if packed and used + tokens > budget_tokens:
+            continue
+        packed.append(doc)
+        used += tokens
+    return packed
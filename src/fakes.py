@@ -0,0 +1,98 @@
+## In-process, deterministic stand-ins for the LLM and the embedding model (load tests, benchmarks, offline runs)
+import time
+import zlib
+import asyncio
+import hashlib
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from src.lexical import tokenize
+
+
+class DeterministicFakeChat(BaseChatModel):
+    """
+    The answer is a pure function of the prompt (same messages -> same words), streamed word by word.
+    `first_token_latency` / `token_delay` simulate a provider without any network, so a load test
+    measures our own overhead on top of a known, fixed model time.
+    """
+
+    streaming: bool = False
+    first_token_latency: float = 0.0
+    token_delay: float = 0.0
+    max_words: int = 40
+
+    @property
+    def _llm_type(self):
+        return "deterministic-fake"
+
+    def _words(self, messages):
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(prompt.encode()).hexdigest()[:8]
+        words = str(messages[-1].content).split()[-self.max_words:]
+        return [f"[{digest}]"] + words
+
+    def _result(self, words):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=" ".join(words)))])
+
+    ## Like ChatGroq: with `streaming` set, invoke() goes through the stream, so token callbacks (and TTFT) fire
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        words = self._words(messages)
+        time.sleep(self.first_token_latency + self.token_delay * len(words))
+        return self._result(words)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.streaming:
+            return await agenerate_from_stream(self._astream(messages, stop=stop, run_manager=run_manager, **kwargs))
+        words = self._words(messages)
+        await asyncio.sleep(self.first_token_latency + self.token_delay * len(words))
+        return self._result(words)
+
+    def _chunks(self, words):
+        for i, word in enumerate(words):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency)
+        for chunk in self._chunks(self._words(messages)):
+            time.sleep(self.token_delay)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for chunk in self._chunks(self._words(messages)):
+            await asyncio.sleep(self.token_delay)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Signed feature hashing of the BM25 terms into `dimension` buckets, L2-normalised.
+    Deterministic across processes (crc32, not the salted `hash`), no model download, microseconds per text;
+    texts sharing terms still land close together, so retrieval behaves plausibly.
+    """
+
+    def __init__(self, dimension=384):
+        self.dimension = dimension
+
+    def _embed(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for term in tokenize(text):
+            h = zlib.crc32(term.encode())
+            vector[h % self.dimension] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
@@ -0,0 +1,152 @@
+## On-disk FAISS index store, content-addressed by the uploaded PDFs
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+
+from src import settings
+from src.tracing import record_cache
+from src.lexical import save_lexical, load_lexical
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(file):
+    ## SHA-256 of the raw PDF bytes (getvalue() shares the upload buffer, no copy)
+    return hashlib.sha256(file.getvalue()).hexdigest()
+
+
+def corpus_key(uploaded_files, params=None):
+    ## Same set of PDFs + same chunking/embedding parameters -> same key (upload order does not matter)
+    h = hashlib.sha256()
+    for digest in sorted(file_digest(file) for file in uploaded_files):
+        h.update(digest.encode())
+    h.update(json.dumps(params if params is not None else settings.index_params(), sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class IndexCache:
+    """
+    One directory per corpus key holding the `save_local` output (index.faiss + index.pkl) and lexical.pkl.
+    The directory mtime is the LRU clock, eviction keeps the store under `max_bytes` and `max_entries`.
+    """
+
+    def __init__(self, root, max_bytes, max_entries):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def get(self, key, embedding):
+        path = self._path(key)
+        with self._lock:
+            if not os.path.isfile(os.path.join(path, "index.faiss")):
+                self.misses += 1
+                record_cache("index", False)
+                return None
+            ## Most recently used from now on: eviction by other sessions' `put` picks older entries
+            os.utime(path)
+        ## Deserialization runs outside the lock, other sessions' lookups/puts do not wait on it
+        try:
+            from langchain_community.vectorstores import FAISS
+            vectordb = FAISS.load_local(path, embedding, allow_dangerous_deserialization=True)
+            load_lexical(vectordb, path)
+        except Exception:
+            ## Corrupt/partial entry, drop it and rebuild
+            logger.exception("Dropping unreadable index cache entry %s", key)
+            with self._lock:
+                shutil.rmtree(path, ignore_errors=True)
+                self.misses += 1
+            record_cache("index", False)
+            return None
+        with self._lock:
+            self.hits += 1
+        record_cache("index", True)
+        return vectordb
+
+    def put(self, key, vectordb):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        vectordb.save_local(tmp_path)
+        save_lexical(vectordb, tmp_path) ## BM25 index lives next to index.faiss/index.pkl
+        with self._lock:
+            if os.path.exists(path):
+                ## Another session stored the same corpus first
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                os.utime(path)
+            else:
+                os.replace(tmp_path, path)
+            self._evict(keep=key)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if ".tmp-" in name or not os.path.isdir(path):
+                continue
+            entries.append((os.path.getmtime(path), name, _dir_size(path)))
+        return sorted(entries)
+
+    def _evict(self, keep=None):
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        count = len(entries)
+        for _, name, size in entries:
+            if total <= self.max_bytes and count <= self.max_entries:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(self._path(name), ignore_errors=True)
+            total -= size
+            count -= 1
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            entries = self._entries()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_index_cache():
+    ## Process-wide store shared by every Streamlit session (None when disabled)
+    global _cache
+    if not settings.INDEX_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = IndexCache(
+                settings.INDEX_CACHE_DIR,
+                max_bytes=settings.INDEX_CACHE_MAX_MB * 1024 * 1024,
+                max_entries=settings.INDEX_CACHE_MAX_ENTRIES,
+            )
+        return _cache
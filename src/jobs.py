@@ -0,0 +1,210 @@
+## Background ingestion: uploads are indexed on a bounded worker pool, the Streamlit script only submits and polls
+import time
+import uuid
+import logging
+import threading
+from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+
+from src import settings
+from src.pipeline import acquire_index
+from src.vectorstore import make_retriever, RerankRetriever
+from src.tracing import session_trace, record_error
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class IngestRejected(RuntimeError):
+    ## Admission control: the container already runs/queues as many ingestions as it accepts
+    pass
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+class LiveIndex:
+    ## The index while it is being built: the writer adds batches under `lock`, readers search under it too
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.vectordb = None
+
+    def publish(self, vectordb):
+        self.vectordb = vectordb
+
+
+class JobRetriever(BaseRetriever):
+    ## First-stage search over whatever part of the job's index is already there, the shared index once done
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    job: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        handle = self.job.handle
+        if handle is not None:
+            return handle.as_retriever(self.k, rerank=False).invoke(query)
+        live = self.job.live
+        if live.vectordb is None:
+            return []
+        with live.lock:
+            ## (trainable indexes hold nothing until their training sample is in)
+            if not live.vectordb.index.ntotal:
+                return []
+            return make_retriever(live.vectordb, self.k, rerank=False).invoke(query)
+
+
+class IngestJob:
+    """
+    One upload being indexed. `loading` / `update` are the extraction / embedding progress callbacks
+    (they raise to cancel between pages and between batches),
+    `retriever()` serves the partial index while running and the shared index once done.
+    """
+
+    def __init__(self, key):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.state = QUEUED
+        self.progress = {"done": 0, "total": None, "rate": 0.0, "eta": None, "files_done": 0, "files_total": None}
+        self.error = None
+        self.handle = None
+        self.live = LiveIndex()
+        self.created = time.time()
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._future = None
+
+    @property
+    def finished(self):
+        return self.state in FINISHED
+
+    @property
+    def partial(self):
+        ## Chunks can already be searched before the job is done
+        return self.state == RUNNING and self.live.vectordb is not None
+
+    def loading(self, files_done, n_files):
+        if self._cancel.is_set():
+            raise IngestCancelled(self.id)
+        self.progress = dict(self.progress, files_done=files_done, files_total=n_files)
+
+    def update(self, done, total, rate, eta):
+        if self._cancel.is_set():
+            raise IngestCancelled(self.id)
+        self.progress = dict(self.progress, done=done, total=total, rate=rate, eta=eta)
+
+    def cancel(self):
+        ## Queued jobs never start, running ones stop after the current page (extraction) or embedding batch
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED)
+
+    def _finish(self, state):
+        self.state = state
+        self.finished_at = time.time()
+        self.live = LiveIndex() ## drop the partial index, the shared one (if any) takes over
+
+    def take_handle(self):
+        ## The session adopts the index: the job (kept in the queue history) must not pin it any longer
+        handle, self.handle = self.handle, None
+        return handle
+
+    def retriever(self, k=None):
+        ## Same stages as `make_retriever`, usable from the moment the job is submitted
+        if settings.RERANK_ENABLED:
+            k = k or settings.RERANK_TOP_K
+            return RerankRetriever(
+                base=JobRetriever(job=self, k=max(settings.RERANK_CANDIDATES, k)),
+                k=k, min_score=settings.RERANK_MIN_SCORE, batch_size=settings.RERANK_BATCH_SIZE,
+            )
+        return JobRetriever(job=self, k=k or settings.RETRIEVER_K)
+
+
+class IngestQueue:
+    """
+    At most `max_active` ingestions run at once (each one already uses every core for extraction/embedding),
+    at most `max_queued` more wait; beyond that `submit` raises IngestRejected.
+    """
+
+    def __init__(self, max_active, max_queued, history=50):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.history = history
+        self.rejected = 0
+        self._jobs = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_active, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+
+    def submit(self, uploaded_files, key, base=None, trace=None):
+        with self._lock:
+            pending = sum(not job.finished for job in self._jobs.values())
+            if pending >= self.max_active + self.max_queued:
+                self.rejected += 1
+                raise IngestRejected("Too many documents are being processed right now, please retry in a moment")
+            job = IngestJob(key)
+            self._jobs[job.id] = job
+            job._future = self._pool.submit(self._run, job, uploaded_files, base, trace)
+            self._prune()
+        return job
+
+    def _run(self, job, uploaded_files, base, trace):
+        if job._cancel.is_set():
+            job._finish(CANCELLED)
+            return
+        job.state = RUNNING
+        try:
+            with session_trace(trace):
+                handle = acquire_index(uploaded_files, job.key, base, job.update, job.live, job.loading)
+        except IngestCancelled:
+            logger.info("Ingestion %s cancelled", job.id)
+            job._finish(CANCELLED)
+        except Exception as e:
+            logger.exception("Ingestion %s failed", job.id)
+            record_error("ingest")
+            job.error = f"{type(e).__name__}: {e}"
+            job._finish(FAILED)
+        else:
+            if job._cancel.is_set():
+                handle.release()
+                job._finish(CANCELLED)
+            else:
+                job.handle = handle
+                job._finish(DONE)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        ## Keep the latest `history` finished jobs for status lookups
+        finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at)
+        for job in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+            ## Done but never adopted (the session went away): let the registry evict the index
+            if job.handle is not None:
+                job.take_handle().release()
+
+    def stats(self):
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+            return {state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)} | {
+                "rejected": self.rejected,
+            }
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_ingest_queue():
+    ## Process-wide: admission control applies to every session of this container
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IngestQueue(settings.INGEST_MAX_ACTIVE, settings.INGEST_MAX_QUEUED)
+        return _queue
@@ -0,0 +1,160 @@
+## In-process BM25 inverted index over the same chunks as the FAISS index
+import os
+import re
+import math
+import heapq
+import pickle
+import threading
+import weakref
+from collections import Counter
+
+## Keeps part numbers, clause IDs and versions ("A-113", "4.2.1", "iso_9001") as single terms,
+## letters/digits of any script ("café", "данные") are terms too
+_TERM_RE = re.compile(r"[^\W_]+(?:[-_./][^\W_]+)*")
+LEXICAL_FILE = "lexical.pkl"
+
+## Query terms that match most chunks: they cost a full posting scan each and barely move the ranking
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here hers him
+his how i if in into is it its itself just me more most my no nor not of off on once only or other our ours out over
+own same she should so some such than that the their theirs them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+## A query term found in more than this share of the chunks is skipped (unless no other term is left)
+MAX_DF = 0.5
+
+
+def tokenize(text):
+    return _TERM_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over docstore ids. Postings are `term -> {doc_id: tf}`, so adding or
+    removing one file's chunks only touches those chunks' terms.
+    Searches skip stopwords and near-ubiquitous terms, and reuse each chunk's length normalisation.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_terms = {}
+        self.total_len = 0
+        self._norms = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_norms"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._norms = None
+        self._lock = threading.Lock()
+
+    def add(self, items):
+        ## items: iterable of (doc_id, text)
+        with self._lock:
+            for doc_id, text in items:
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[doc_id] = tf
+                length = sum(counts.values())
+                self.doc_terms[doc_id] = (tuple(counts), length)
+                self.total_len += length
+            self._norms = None
+
+    def remove(self, doc_ids):
+        with self._lock:
+            for doc_id in doc_ids:
+                terms, length = self.doc_terms.pop(doc_id, ((), 0))
+                self.total_len -= length
+                for term in terms:
+                    posting = self.postings.get(term)
+                    if posting is not None:
+                        posting.pop(doc_id, None)
+                        if not posting:
+                            del self.postings[term]
+            self._norms = None
+
+    def _doc_norms(self):
+        ## doc_id -> k1 * (1 - b + b * len / avg_len), recomputed once after the index changes
+        if self._norms is None:
+            avg_len = self.total_len / len(self.doc_terms)
+            ## (no chunk has a term: every length is 0 as well)
+            a, c = self.k1 * (1 - self.b), self.k1 * self.b / avg_len if avg_len else 0.0
+            self._norms = {doc_id: a + c * length for doc_id, (_, length) in self.doc_terms.items()}
+        return self._norms
+
+    def query_terms(self, query):
+        ## [(term, posting)] worth scoring, rarest first
+        terms = set(tokenize(query))
+        found = [(term, self.postings[term]) for term in terms if term in self.postings]
+        found.sort(key=lambda item: len(item[1]))
+        selective = [(term, posting) for term, posting in found if term not in STOPWORDS]
+        max_df = MAX_DF * len(self.doc_terms)
+        rare = [(term, posting) for term, posting in selective if len(posting) <= max_df]
+        ## A query made only of common words still ranks by its rarest one, stopwords alone carry no signal
+        return rare or selective[:1]
+
+    def search(self, query, k=10):
+        ## [(doc_id, score)] best first
+        with self._lock:
+            n_docs = len(self.doc_terms)
+            if not n_docs:
+                return []
+            terms = self.query_terms(query)
+            if not terms:
+                return []
+            norms = self._doc_norms()
+            scores = {}
+            get = scores.get
+            for term, posting in terms:
+                weight = (self.k1 + 1) * math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    scores[doc_id] = get(doc_id, 0.0) + weight * tf / (tf + norms[doc_id])
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    @classmethod
+    def from_vectorstore(cls, vectordb):
+        index = cls()
+        index.add((doc_id, vectordb.docstore.search(doc_id).page_content) for doc_id in vectordb.index_to_docstore_id.values())
+        return index
+
+
+## Each FAISS store's lexical index travels with it (without subclassing FAISS)
+_lexical = weakref.WeakKeyDictionary()
+
+
+def attach_lexical(vectordb, index):
+    _lexical[vectordb] = index
+    return vectordb
+
+
+def get_lexical(vectordb):
+    return _lexical.get(vectordb)
+
+
+def save_lexical(vectordb, folder):
+    index = get_lexical(vectordb)
+    if index is not None:
+        with open(os.path.join(folder, LEXICAL_FILE), "wb") as f:
+            pickle.dump(index, f)
+
+
+def load_lexical(vectordb, folder):
+    ## Persisted index when present, otherwise rebuilt from the docstore (older cache entries)
+    path = os.path.join(folder, LEXICAL_FILE)
+    if os.path.isfile(path):
+        with open(path, "rb") as f:
+            index = pickle.load(f)
+    else:
+        index = BM25Index.from_vectorstore(vectordb)
+    return attach_lexical(vectordb, index)
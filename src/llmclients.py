@@ -0,0 +1,58 @@
+## Pooled keep-alive HTTP clients (one pair per provider + API key) and reused chat model instances
+import hashlib
+import threading
+from collections import OrderedDict
+import httpx
+
+from src import settings
+
+_clients = {}
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def _key_id(api_key):
+    ## Cache keys never hold the raw API key
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+def get_http_clients(provider, api_key):
+    ## (sync, async) httpx clients sharing the same connection limits, reused by every session with this key
+    key = (provider, _key_id(api_key))
+    with _lock:
+        if key not in _clients:
+            limits = httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS,
+                keepalive_expiry=60,
+            )
+            timeout = httpx.Timeout(settings.HTTP_TIMEOUT, connect=10)
+            _clients[key] = (httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout))
+        return _clients[key]
+
+
+def get_groq_chat(api_key, model, temperature=0.5, streaming=False, tags=None):
+    ## Chat models are stateless (callbacks are passed per call), so identical configs share one instance
+    key = (_key_id(api_key), model, temperature, streaming, tuple(tags or ()))
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key]
+
+    from langchain_groq import ChatGroq ## the groq SDK is only loaded once a Groq model is configured
+    http_client, http_async_client = get_http_clients("groq", api_key)
+    llm = ChatGroq(
+        model=model,
+        groq_api_key=api_key,
+        temperature=temperature,
+        streaming=streaming,
+        tags=tags,
+        base_url=settings.GROQ_BASE_URL or None,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+    with _lock:
+        llm = _models.setdefault(key, llm)
+        while len(_models) > settings.LLM_INSTANCE_CACHE:
+            _models.popitem(last=False)
+    return llm
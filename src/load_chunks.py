@@ -1,28 +1,237 @@
 ## All functional helper
-import os
-import tempfile
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-
-def loadfile(uploaded_files):
-    docs = []
-    temp_dir = tempfile.TemporaryDirectory() ## create a temporary directory
-    for file in uploaded_files:
-        temp_filepath = os.path.join(temp_dir.name, file.name) ## create a temporary file
-        with open(temp_filepath, "wb") as f:
-            f.write(file.getvalue())
-            
-        loader = PyPDFLoader(temp_filepath) ## Load the file
-        docs = loader.load()
-        docs.extend(docs)
+import io
+import time
+import logging
+import threading
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from langchain_core.documents import Document
+
+from src import settings
+from src.chunker import StructuredChunker
+from src.indexcache import file_digest
+from src.tracing import span, record_span
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_ingest_pool():
+    ## Process-wide worker pool, "spawn" so workers never inherit Streamlit/torch threads
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.INGEST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def reset_ingest_pool(broken):
+    ## A worker died (e.g. the PDF library crashed on a malformed file): the next caller gets a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+## ---------------- PDF extraction engines ---------------- ##
+
+def as_pdf_bytes(data):
+    ## Upload buffer -> bytes without copying (BytesIO.getvalue() returns its own bytes object)
+    if hasattr(data, "getvalue"):
+        return data.getvalue()
+    if isinstance(data, memoryview):
+        if isinstance(data.obj, bytes) and data.nbytes == len(data.obj):
+            return data.obj
+        return data.tobytes()
+    return data
+
+
+class PDFExtractor(ABC):
+    """Turns one in-memory PDF into one Document per page with `{"source", "page"}` metadata."""
+    name = None
+
+    @abstractmethod
+    def iter_pages(self, data, source):
+        ## Lazily yields pages so a large PDF is never fully decoded at once
+        ...
+
+    def extract(self, data, source):
+        return list(self.iter_pages(data, source))
+
+    @staticmethod
+    def page_document(text, source, page):
+        ## Same metadata whatever the engine
+        return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+class PyPDFExtractor(PDFExtractor):
+    ## Pure-python pypdf, same text as LangChain's PyPDFLoader
+    name = "pypdf"
+
+    def iter_pages(self, data, source):
+        from pypdf import PdfReader
+        reader = PdfReader(io.BytesIO(as_pdf_bytes(data)))
+        for number, page in enumerate(reader.pages):
+            yield self.page_document(page.extract_text(), source, number)
+
+
+class PyMuPDFExtractor(PDFExtractor):
+    ## MuPDF (C library), several times faster than pypdf
+    name = "pymupdf"
+
+    def iter_pages(self, data, source):
+        import pymupdf
+        with pymupdf.open(stream=as_pdf_bytes(data), filetype="pdf") as pdf:
+            for number in range(pdf.page_count):
+                yield self.page_document(pdf.load_page(number).get_text(), source, number)
+
+
+EXTRACTORS = {
+    PyMuPDFExtractor.name: PyMuPDFExtractor,
+    PyPDFExtractor.name: PyPDFExtractor,
+}
+
+
+def get_extractor(engine=None):
+    engine = engine or settings.PDF_ENGINE
+    if engine not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF engine {engine!r}, choose one of {sorted(EXTRACTORS)}")
+    return EXTRACTORS[engine]()
+
+
+def extract_pages(name, data, engine=None):
+    ## Runs inside a worker: parse one PDF into one Document per page
+    return get_extractor(engine).extract(data, name)
+
+
+def tag_file_hash(pages, file_hash):
+    ## Every chunk remembers which upload it came from (used to delete a removed file's vectors)
+    for page in pages:
+        page.metadata["file_hash"] = file_hash
+        yield page
+
+
+def iter_loaded(uploaded_files, engine=None):
+    ## Yields (upload position, pages) as each file finishes, in completion order
+    engine = engine or settings.PDF_ENGINE
+    if len(uploaded_files) <= 1 or settings.INGEST_WORKERS <= 1:
+        ## In-process: read straight from the upload buffer, one page at a time
+        extractor = get_extractor(engine)
+        for position, file in enumerate(uploaded_files):
+            yield position, tag_file_hash(extractor.iter_pages(file, file.name), file_digest(file))
+        return
+
+    ## The pool is shared: a crash caused by another upload breaks our futures too, so the files
+    ## not read yet are retried once on a fresh pool, a second crash fails this ingestion only
+    pending = dict(enumerate(uploaded_files))
+    for attempt in range(2):
+        pool = get_ingest_pool()
+        futures = {}
+        try:
+            for position, file in pending.items():
+                futures[pool.submit(extract_pages, file.name, as_pdf_bytes(file), engine)] = position
+            for future in as_completed(futures):
+                position = futures[future]
+                pages = future.result()
+                yield position, tag_file_hash(pages, file_digest(pending.pop(position)))
+            return
+        except BrokenProcessPool:
+            reset_ingest_pool(pool)
+            if attempt:
+                raise
+            logger.warning("Extraction pool broke, retrying %s file(s) on a fresh pool", len(pending))
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def loadfile(uploaded_files, engine=None):
+    with span("load"):
+        loaded = dict(iter_loaded(uploaded_files, engine))
+        docs = []
+        for position in sorted(loaded):
+            docs.extend(loaded[position]) ## consumes lazy page iterators
     
     return docs
     
 
+def make_splitter(chunker=None):
+    ## start_index lets the prompt packer merge overlapping neighbours exactly
+    chunker = chunker or settings.CHUNKER
+    if chunker == "structured":
+        return StructuredChunker()
+    if chunker == "recursive":
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        return RecursiveCharacterTextSplitter(
+            chunk_size=settings.CHUNK_SIZE, chunk_overlap=settings.CHUNK_OVERLAP, add_start_index=True
+        )
+    raise ValueError(f"Unknown chunker {chunker!r}, choose 'structured' or 'recursive'")
+
+
 def docs_to_chunks(doc):
     # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    chunks = text_splitter.split_documents(doc)
+    text_splitter = make_splitter()
+    with span("split"):
+        chunks = text_splitter.split_documents(doc)
+
+    return chunks
+
+
+def iter_chunks(uploaded_files, engine=None, loading=None):
+    """
+    Chunks as a stream, page by page in file completion order: can feed `embed_into_vectorstore`
+    directly, the full chunk list is never built. load/split spans are recorded once it is exhausted.
+    `loading(files_done, n_files)` is called after every page and file (it may raise to stop the extraction).
+    """
+    text_splitter = make_splitter()
+    start = time.perf_counter()
+    split_seconds = 0.0
+    consumer_seconds = 0.0
+    for files_done, (_, pages) in enumerate(iter_loaded(uploaded_files, engine)):
+        for page in pages: ## page by page, the whole decoded file is never held at once
+            if loading:
+                loading(files_done, len(uploaded_files))
+            split_start = time.perf_counter()
+            chunks = text_splitter.split_documents([page])
+            split_seconds += time.perf_counter() - split_start
+            yield_start = time.perf_counter()
+            yield from chunks
+            consumer_seconds += time.perf_counter() - yield_start
+        if loading:
+            loading(files_done + 1, len(uploaded_files))
+
+    ## Extraction and splitting interleave: everything that is neither splitting nor the consumer is loading
+    record_span("load", time.perf_counter() - start - split_seconds - consumer_seconds)
+    record_span("split", split_seconds)
+
+
+def load_chunks(uploaded_files, engine=None, loading=None):
+    ## Extract in parallel and split each file as soon as its pages arrive (result keeps upload order)
+    ## `loading`: see `iter_chunks`
+    text_splitter = make_splitter()
+    chunks = {}
+    start = time.perf_counter()
+    split_seconds = 0.0
+    for position, pages in iter_loaded(uploaded_files, engine):
+        chunks[position] = []
+        for page in pages: ## page by page, the whole decoded file is never held at once
+            if loading:
+                loading(len(chunks) - 1, len(uploaded_files))
+            split_start = time.perf_counter()
+            chunks[position].extend(text_splitter.split_documents([page]))
+            split_seconds += time.perf_counter() - split_start
+        if loading:
+            loading(len(chunks), len(uploaded_files))
 
-    return chunks
\ No newline at end of file
+    ## Extraction and splitting interleave: everything that is not splitting is loading
+    record_span("load", time.perf_counter() - start - split_seconds)
+    record_span("split", split_seconds)
+    return [chunk for position in sorted(chunks) for chunk in chunks[position]]
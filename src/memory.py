@@ -0,0 +1,72 @@
+## Conversation memory that stays inside a token budget
+from typing import List, Optional
+from langchain.memory import ConversationBufferMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import SystemMessage, get_buffer_string
+from langchain_core.runnables.config import run_in_executor
+
+from src.tokens import count_message_tokens
+
+
+class TokenBudgetMemory(ConversationBufferMemory):
+    """
+    Keeps the most recent turns verbatim while they fit in `max_token_limit`.
+    Older turns are dropped, or folded into a running summary when an `llm` is given.
+    """
+
+    max_token_limit: int = 2000
+    llm: Optional[BaseLanguageModel] = None
+    summary: str = ""
+    pruned_tokens: int = 0
+    ## One entry per turn: history tokens sent ("kept") vs. what the full buffer would have cost ("full")
+    turn_tokens: List[dict] = []
+
+    def _history(self):
+        messages = list(self.chat_memory.messages)
+        if self.summary:
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+        return messages
+
+    def load_memory_variables(self, inputs):
+        messages = self._history()
+        kept = count_message_tokens(messages)
+        self.turn_tokens.append({"kept": kept, "full": count_message_tokens(self.chat_memory.messages) + self.pruned_tokens})
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs, outputs):
+        super().save_context(inputs, outputs)
+        messages = list(self.chat_memory.messages)
+        pruned = []
+        ## Drop whole (human, ai) turns from the front, always keep the latest turn
+        while len(messages) > 2 and count_message_tokens(messages) > self.max_token_limit:
+            pruned.extend(messages[:2])
+            messages = messages[2:]
+        if not pruned:
+            return
+
+        self.pruned_tokens += count_message_tokens(pruned)
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(messages)
+        if self.llm is not None:
+            prompt = SUMMARY_PROMPT.format(summary=self.summary, new_lines=get_buffer_string(pruned))
+            self.summary = self.llm.invoke(prompt).content
+
+    ## The async chain path (`ainvoke`) would otherwise use the base class's async versions and skip the budget
+    async def aload_memory_variables(self, inputs):
+        return await run_in_executor(None, self.load_memory_variables, inputs)
+
+    async def asave_context(self, inputs, outputs):
+        await run_in_executor(None, self.save_context, inputs, outputs)
+
+    def clear(self):
+        super().clear()
+        self.summary = ""
+        self.pruned_tokens = 0
+        self.turn_tokens = []
+
+    @property
+    def last_turn_tokens(self):
+        return self.turn_tokens[-1] if self.turn_tokens else None
@@ -0,0 +1,52 @@
+## Ingestion pipeline: uploaded PDFs -> FAISS vectorstore
+from src import settings
+from src.load_chunks import load_chunks, iter_chunks
+from src.vectorstore import get_embeddings, build_vectorstore, indexed_files, update_vectorstore
+from src.indexcache import corpus_key, file_digest, get_index_cache
+from src.registry import get_index_registry
+
+
+def sync_vectordb(vectordb, uploaded_files, progress=None, live=None, loading=None):
+    ## Bring an existing index in line with the current upload set (added/removed files only)
+    indexed = indexed_files(vectordb)
+    current = {file_digest(file): file for file in uploaded_files}
+    remove_ids = [doc_id for file_hash, ids in indexed.items() if file_hash not in current for doc_id in ids]
+    new_files = [file for file_hash, file in current.items() if file_hash not in indexed]
+    ## (indexes that cannot drop vectors are rebuilt from their stored vectors, see `rebuild_without`)
+    documents = load_chunks(new_files, loading=loading) if new_files else []
+    return update_vectorstore(vectordb, documents, remove_ids, progress=progress, live=live)
+
+
+def build_vectordb(uploaded_files, key=None, base=None, progress=None, live=None, loading=None):
+    ## `base`: the session's current IndexHandle, a private copy of it is updated instead of a rebuild
+    ## `progress` / `live`: embedding progress callback and partial-index sink, see `embed_into_vectorstore`
+    ## `loading`: extraction progress callback, see `iter_chunks`
+    model_embed = get_embeddings()
+    cache = get_index_cache()
+    key = key or corpus_key(uploaded_files)
+
+    ## Repeat upload: skip parsing and embedding entirely
+    if cache is not None:
+        cached = cache.get(key, model_embed)
+        if cached is not None:
+            return cached
+
+    if base is not None and settings.INCREMENTAL_INDEX:
+        ## Shared indexes are read-only: copy-on-write
+        vectordb = sync_vectordb(base.private_copy(), uploaded_files, progress, live, loading)
+    else:
+        ## Extract (process pool) -> Split document to Chunks -> Embed + vectorstore
+        ## "auto" and IVF types are sized from the chunk count, so they need the full list; the others stream
+        streamable = settings.INDEX_TYPE in ("flat", "sq8", "fp16", "hnsw")
+        documents = iter_chunks(uploaded_files, loading=loading) if streamable else load_chunks(uploaded_files, loading=loading)
+        vectordb = build_vectorstore(documents, model_embed, progress, live)
+
+    if cache is not None:
+        cache.put(key, vectordb)
+    return vectordb
+
+
+def acquire_index(uploaded_files, key=None, base=None, progress=None, live=None, loading=None):
+    ## Handle on the process-wide shared index for this upload set (built once, whatever the number of sessions)
+    key = key or corpus_key(uploaded_files)
+    return get_index_registry().acquire(key, lambda: build_vectordb(uploaded_files, key, base, progress, live, loading))
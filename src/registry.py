@@ -0,0 +1,147 @@
+## Process-level registry of shared, read-only FAISS indexes (one per corpus, whatever the number of sessions)
+import pickle
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from langchain_community.vectorstores import FAISS
+
+from src import settings
+from src.lexical import attach_lexical, get_lexical
+from src.vectorstore import make_retriever
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_bytes(vectordb):
+    ## Vectors (float32 upper bound) + chunk text held by the docstore
+    index = vectordb.index
+    text = sum(len(doc.page_content) for doc in vectordb.docstore._dict.values())
+    return index.ntotal * index.d * 4 + text
+
+
+class IndexHandle:
+    """
+    A session's reference to a shared index. Only retrieval is exposed: callers that need to
+    change the index (incremental updates) take a `private_copy()` instead of mutating it.
+    The reference is released explicitly or when the session state holding it is garbage collected.
+    """
+
+    def __init__(self, registry, key, vectordb):
+        self.key = key
+        self._vectordb = vectordb
+        self._finalizer = weakref.finalize(self, registry._release, key)
+
+    def as_retriever(self, k=None, rerank=None):
+        return make_retriever(self._vectordb, k, rerank)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self._vectordb.similarity_search(query, k=k, **kwargs)
+
+    def private_copy(self):
+        vectordb = FAISS.deserialize_from_bytes(
+            self._vectordb.serialize_to_bytes(),
+            self._vectordb.embeddings,
+            allow_dangerous_deserialization=True,
+        )
+        lexical = get_lexical(self._vectordb)
+        if lexical is not None:
+            attach_lexical(vectordb, pickle.loads(pickle.dumps(lexical)))
+        return vectordb
+
+    def release(self):
+        self._finalizer()
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+
+class _Entry:
+    def __init__(self, vectordb):
+        self.vectordb = vectordb
+        self.refs = 0
+        self.nbytes = estimate_bytes(vectordb)
+
+
+class IndexRegistry:
+    ## Reference-counted indexes, idle ones (refs == 0) are evicted LRU-first above `max_bytes`
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.builds = 0
+        self.shares = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def _handle(self, key):
+        entry = self._entries[key]
+        entry.refs += 1
+        self._entries.move_to_end(key)
+        return IndexHandle(self, key, entry.vectordb)
+
+    def acquire(self, key, build):
+        ## Returns a handle on the index for `key`, calling `build()` only if no session holds it yet
+        with self._lock:
+            if key in self._entries:
+                self.shares += 1
+                return self._handle(key)
+            key_lock = self._building.setdefault(key, threading.Lock())
+
+        ## One build per corpus, concurrent sessions with the same upload wait for it
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self.shares += 1
+                    return self._handle(key)
+            vectordb = build()
+            with self._lock:
+                self._entries[key] = _Entry(vectordb)
+                self._building.pop(key, None)
+                self.builds += 1
+                handle = self._handle(key)
+                self._evict()
+                return handle
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs = max(0, entry.refs - 1)
+                self._evict()
+
+    def _evict(self):
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refs == 0:
+                del self._entries[key]
+                total -= entry.nbytes
+                self.evictions += 1
+                logger.info("Evicted idle shared index %s (%d bytes)", key, entry.nbytes)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "indexes": len(self._entries),
+                "handles": sum(entry.refs for entry in self._entries.values()),
+                "bytes": sum(entry.nbytes for entry in self._entries.values()),
+                "builds": self.builds,
+                "shares": self.shares,
+                "evictions": self.evictions,
+            }
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_index_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = IndexRegistry(max_bytes=settings.INDEX_REGISTRY_MAX_MB * 1024 * 1024)
+        return _registry
@@ -0,0 +1,86 @@
+## Decide locally whether a follow-up needs the LLM "standalone question" rewrite before retrieval
+import re
+import threading
+
+from src.tracing import record_rewrite
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+## Words that point back into the conversation
+_ANAPHORA = {
+    "it", "its", "this", "these", "those", "they", "them", "their", "theirs",
+    "he", "she", "him", "her", "his", "hers", "former", "latter", "above", "previous",
+    "earlier", "aforementioned",
+}
+_FOLLOW_UP_STARTS = (
+    "and ", "but ", "so ", "or ", "what about", "how about", "tell me more", "continue", "go on",
+    "elaborate", "expand",
+)
+## Common words/openers that only hint at a follow-up in a short question ("Why?", "One more example")
+_WEAK_ANAPHORA = {
+    "that", "same", "else", "more", "further", "again", "also", "too", "there", "then",
+    "one", "ones", "another", "other", "others",
+}
+_WEAK_FOLLOW_UP_STARTS = ("why", "explain", "example")
+_STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "and", "or", "is", "are", "was", "were",
+    "be", "been", "do", "does", "did", "what", "which", "who", "whom", "how", "when", "where",
+    "with", "by", "as", "at", "from", "about", "can", "could", "would", "should", "i", "you",
+    "me", "my", "your", "we", "our", "please", "tell", "give", "explain", "describe",
+    "human", "assistant",
+}
+
+
+def _content_words(text):
+    return {word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS}
+
+
+class RewriteGate:
+    """
+    Cheap heuristic in front of the condense-question LLM call.
+    A question is treated as standalone (no rewrite) on the first turn, or when it has no
+    anaphora/follow-up phrasing and shares few content words with the last exchange.
+    Weak cues (generic openers, common words) only count in questions of at most `short_words` words.
+    """
+
+    def __init__(self, min_words=4, max_overlap=0.5, history_chars=1500, short_words=5):
+        self.min_words = min_words
+        self.short_words = short_words
+        self.max_overlap = max_overlap
+        self.history_chars = history_chars
+        self.rewrites = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def needs_rewrite(self, question, history):
+        if not history or not history.strip():
+            return False
+        lowered = question.strip().lower()
+        words = _WORD_RE.findall(lowered)
+        if len(words) < self.min_words or lowered.startswith(_FOLLOW_UP_STARTS):
+            return True
+        if _ANAPHORA.intersection(words):
+            return True
+        if len(words) <= self.short_words and (lowered.startswith(_WEAK_FOLLOW_UP_STARTS) or _WEAK_ANAPHORA.intersection(words)):
+            return True
+        ## High overlap with the latest exchange -> likely continues it
+        question_words = _content_words(lowered)
+        if not question_words:
+            return True
+        overlap = len(question_words & _content_words(history[-self.history_chars:])) / len(question_words)
+        return overlap > self.max_overlap
+
+    def check(self, question, history):
+        ## needs_rewrite() + counters
+        decision = self.needs_rewrite(question, history)
+        with self._lock:
+            if decision:
+                self.rewrites += 1
+            else:
+                self.skipped += 1
+        record_rewrite(decision)
+        return decision
+
+    def stats(self):
+        with self._lock:
+            return {"rewrites": self.rewrites, "skipped": self.skipped}
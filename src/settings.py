@@ -0,0 +1,137 @@
+## Runtime settings, every value can be overridden with a DOCHAT_* environment variable
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _flag(name, default):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+## Ingestion worker processes used to extract several PDFs at once
+INGEST_WORKERS = int(os.getenv("DOCHAT_INGEST_WORKERS", str(os.cpu_count() or 1)))
+## PDF text extraction engine: "pymupdf" (fast, default) or "pypdf"
+PDF_ENGINE = os.getenv("DOCHAT_PDF_ENGINE", "pymupdf")
+
+## Chunking + embedding (part of the index cache key)
+## "recursive" (characters, CHUNK_SIZE/CHUNK_OVERLAP) or, opt-in, "structured" (headings/paragraphs/tables,
+## sized in embedder tokens so nothing is truncated: ~5x slower to split and ~60% more chunks to embed on sample/)
+CHUNKER = os.getenv("DOCHAT_CHUNKER", "recursive")
+CHUNK_SIZE = int(os.getenv("DOCHAT_CHUNK_SIZE", "1500"))
+CHUNK_OVERLAP = int(os.getenv("DOCHAT_CHUNK_OVERLAP", "200"))
+## Structured chunks: all-MiniLM-L6-v2 truncates its input at 256 tokens
+CHUNK_TOKENS = int(os.getenv("DOCHAT_CHUNK_TOKENS", "250"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("DOCHAT_CHUNK_OVERLAP_TOKENS", "32"))
+## Token counts from the embedding model's tokenizer ("model") or the local estimate ("estimate")
+CHUNK_TOKENIZER = os.getenv("DOCHAT_CHUNK_TOKENIZER", "model")
+EMBED_MODEL = os.getenv("DOCHAT_EMBED_MODEL", "all-MiniLM-L6-v2")
+## Embedding backend: "hf" (sentence-transformers/torch), "onnx" (ONNX Runtime via fastembed) or "fake" (hashed features, offline)
+EMBED_BACKEND = os.getenv("DOCHAT_EMBED_BACKEND", "hf")
+FAKE_EMBED_DIM = int(os.getenv("DOCHAT_FAKE_EMBED_DIM", "384"))
+## Chunks per encode call and torch threads used by the encoder
+EMBED_BATCH_SIZE = int(os.getenv("DOCHAT_EMBED_BATCH_SIZE", "64"))
+EMBED_THREADS = int(os.getenv("DOCHAT_EMBED_THREADS", str(os.cpu_count() or 1)))
+## Load the shared embedding model when the app starts instead of on the first upload
+PREWARM_EMBEDDINGS = _flag("DOCHAT_PREWARM_EMBEDDINGS", "0")
+
+## FAISS index: "auto" (by chunk count) or one of flat, sq8, fp16, hnsw, ivf, ivfpq
+INDEX_TYPE = os.getenv("DOCHAT_INDEX_TYPE", "auto")
+INDEX_HNSW_FROM = int(os.getenv("DOCHAT_INDEX_HNSW_FROM", "20000"))
+INDEX_IVFPQ_FROM = int(os.getenv("DOCHAT_INDEX_IVFPQ_FROM", "200000"))
+HNSW_M = int(os.getenv("DOCHAT_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("DOCHAT_HNSW_EF_SEARCH", "64"))
+IVF_NPROBE = int(os.getenv("DOCHAT_IVF_NPROBE", "16"))
+
+## Retrieval: "hybrid" (BM25 + vectors, reciprocal-rank fusion) or "dense"
+RETRIEVAL_MODE = os.getenv("DOCHAT_RETRIEVAL_MODE", "hybrid")
+RETRIEVER_K = int(os.getenv("DOCHAT_RETRIEVER_K", "4"))
+RETRIEVER_FETCH_K = int(os.getenv("DOCHAT_RETRIEVER_FETCH_K", "20"))
+RRF_K = int(os.getenv("DOCHAT_RRF_K", "60"))
+
+## Optional cross-encoder re-ranking: RERANK_CANDIDATES first-stage hits -> RERANK_TOP_K best (scores memoized)
+RERANK_ENABLED = _flag("DOCHAT_RERANK", "0")
+RERANK_MODEL = os.getenv("DOCHAT_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("DOCHAT_RERANK_CANDIDATES", "20"))
+RERANK_TOP_K = int(os.getenv("DOCHAT_RERANK_TOP_K", "3"))
+RERANK_MIN_SCORE = float(os.getenv("DOCHAT_RERANK_MIN_SCORE", "-inf"))
+RERANK_BATCH_SIZE = int(os.getenv("DOCHAT_RERANK_BATCH_SIZE", "32"))
+RERANK_CACHE_SIZE = int(os.getenv("DOCHAT_RERANK_CACHE_SIZE", "20000"))
+
+## Prompt context: retrieved chunks are deduplicated/merged and packed up to this many tokens (0 = off)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("DOCHAT_CONTEXT_TOKEN_BUDGET", "1500"))
+
+## Bump when the chunk metadata layout or the BM25 terms change so stale cached indexes are not reused
+INDEX_SCHEMA = 5
+## Add/remove only the changed files when the session already has an index
+INCREMENTAL_INDEX = _flag("DOCHAT_INCREMENTAL_INDEX", "1")
+
+## Background ingestion jobs per container: running at once, waiting beyond that (more are rejected)
+INGEST_MAX_ACTIVE = int(os.getenv("DOCHAT_INGEST_MAX_ACTIVE", "2"))
+INGEST_MAX_QUEUED = int(os.getenv("DOCHAT_INGEST_MAX_QUEUED", "8"))
+
+## In-memory shared indexes: idle ones are evicted above this size
+INDEX_REGISTRY_MAX_MB = int(os.getenv("DOCHAT_INDEX_REGISTRY_MAX_MB", "2048"))
+
+## On-disk FAISS index cache
+INDEX_CACHE_ENABLED = _flag("DOCHAT_INDEX_CACHE", "1")
+INDEX_CACHE_DIR = os.getenv("DOCHAT_INDEX_CACHE_DIR", os.path.join(".cache", "indexes"))
+INDEX_CACHE_MAX_MB = int(os.getenv("DOCHAT_INDEX_CACHE_MAX_MB", "1024"))
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv("DOCHAT_INDEX_CACHE_MAX_ENTRIES", "64"))
+
+## Chat memory: "buffer" (unbounded), "window" (drop old turns) or "summary" (summarize old turns)
+MEMORY_MODE = os.getenv("DOCHAT_MEMORY_MODE", "window")
+## History tokens resent per turn, keeps llama3-8b-8192 well inside its context
+MEMORY_TOKEN_BUDGET = int(os.getenv("DOCHAT_MEMORY_TOKEN_BUDGET", "2000"))
+
+## Semantic answer cache (set DOCHAT_ANSWER_CACHE_DIR to also keep it on disk)
+ANSWER_CACHE_ENABLED = _flag("DOCHAT_ANSWER_CACHE", "1")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("DOCHAT_ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("DOCHAT_ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("DOCHAT_ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_DIR = os.getenv("DOCHAT_ANSWER_CACHE_DIR", "")
+
+## LLM calls: async chain path on a shared event loop, pooled keep-alive HTTP clients
+ASYNC_CHAIN = _flag("DOCHAT_ASYNC_CHAIN", "1")
+LLM_CONCURRENCY = int(os.getenv("DOCHAT_LLM_CONCURRENCY", "16"))
+LLM_MAX_PENDING = int(os.getenv("DOCHAT_LLM_MAX_PENDING", "256"))
+LLM_INSTANCE_CACHE = int(os.getenv("DOCHAT_LLM_INSTANCE_CACHE", "64"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("DOCHAT_HTTP_MAX_CONNECTIONS", "32"))
+HTTP_TIMEOUT = float(os.getenv("DOCHAT_HTTP_TIMEOUT", "60"))
+## Inference backends offered in the sidebar (see src/backends.py: Groq, Fake, LlamaCpp)
+INFERENCE_OPTIONS = [name.strip() for name in os.getenv("DOCHAT_INFERENCE_OPTIONS", "Groq").split(",") if name.strip()]
+## Deterministic fake LLM: seconds before the first token and between tokens
+FAKE_LLM_LATENCY = float(os.getenv("DOCHAT_FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_TOKEN_DELAY = float(os.getenv("DOCHAT_FAKE_LLM_TOKEN_DELAY", "0"))
+## CPU-local llama.cpp model (GGUF file)
+LLAMACPP_MODEL_PATH = os.getenv("DOCHAT_LLAMACPP_MODEL_PATH", "")
+LLAMACPP_N_CTX = int(os.getenv("DOCHAT_LLAMACPP_N_CTX", "8192"))
+LLAMACPP_THREADS = int(os.getenv("DOCHAT_LLAMACPP_THREADS", str(os.cpu_count() or 1)))
+LLAMACPP_MAX_TOKENS = int(os.getenv("DOCHAT_LLAMACPP_MAX_TOKENS", "512"))
+## Point ChatGroq somewhere else, e.g. the local stub server (benchmarks/stub_groq.py)
+GROQ_BASE_URL = os.getenv("DOCHAT_GROQ_BASE_URL", "")
+
+## Chat UI: messages drawn as bubbles on each rerun, older ones are paged
+CHAT_VISIBLE_MESSAGES = int(os.getenv("DOCHAT_CHAT_VISIBLE_MESSAGES", "20"))
+CHAT_PAGE_SIZE = int(os.getenv("DOCHAT_CHAT_PAGE_SIZE", "20"))
+
+## Observability: Prometheus text export on this port (0 = off) and a sidebar debug panel
+METRICS_PORT = int(os.getenv("DOCHAT_METRICS_PORT", "0"))
+DEBUG_PANEL = _flag("DOCHAT_DEBUG_PANEL", "0")
+
+
+def index_params():
+    ## Everything that changes the content of a built index
+    return {
+        "schema": INDEX_SCHEMA,
+        "chunker": CHUNKER,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "chunk_tokens": CHUNK_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        "chunk_tokenizer": CHUNK_TOKENIZER,
+        "embed_model": EMBED_MODEL,
+        "embed_backend": EMBED_BACKEND,
+        "pdf_engine": PDF_ENGINE,
+        "index_type": INDEX_TYPE,
+    }
@@ -0,0 +1,14 @@
+## Cheap local token estimates (no tokenizer download, good enough for budgeting)
+import re
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    ## Words and punctuation, long words count as several BPE pieces
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_RE.findall(text or ""))
+
+
+def count_message_tokens(messages):
+    ## + a few tokens of role/formatting overhead per message
+    return sum(count_tokens(message.content) + 4 for message in messages)
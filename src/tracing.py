@@ -0,0 +1,167 @@
+## Per-stage latency spans, token counts and cache hits + a Prometheus text export (stdlib only, cheap to import)
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("load", "split", "embed", "index", "condense", "retrieve", "rerank", "generate")
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, float("inf"))
+
+
+class Metrics:
+    ## Process-wide counters + histograms, keyed by (name, sorted labels)
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            histogram = self._histograms.setdefault(self._key(name, labels), {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render_prometheus(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"{name}{fmt(labels)} {value:g}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                for bound, count in zip(BUCKETS, histogram["buckets"]):
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', le)])} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {histogram['sum']:g}")
+                lines.append(f"{name}_count{fmt(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class SessionTrace:
+    ## What one Streamlit session did: spans of the last run + running totals
+    def __init__(self, max_spans=200):
+        self.max_spans = max_spans
+        self.spans = []
+        self.tokens = defaultdict(int)
+        self.cache = defaultdict(int)
+        self.rewrite = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, seconds):
+        with self._lock:
+            self.spans.append({"stage": stage, "seconds": seconds, "at": time.time()})
+            del self.spans[:-self.max_spans]
+
+    def totals(self):
+        ## Seconds per stage over the recorded spans
+        with self._lock:
+            totals = defaultdict(float)
+            for span in self.spans:
+                totals[span["stage"]] += span["seconds"]
+            return dict(totals)
+
+
+_current = contextvars.ContextVar("dochat_trace", default=None)
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def session_trace(trace):
+    ## Attribute everything recorded inside the block to `trace`
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record_span(stage, seconds):
+    METRICS.observe("dochat_stage_seconds", seconds, stage=stage)
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+def record_cache(cache, hit):
+    result = "hit" if hit else "miss"
+    METRICS.inc("dochat_cache_total", cache=cache, result=result)
+    trace = _current.get()
+    if trace is not None:
+        trace.cache[f"{cache}_{result}"] += 1
+
+
+def record_tokens(kind, count, stage):
+    METRICS.inc("dochat_llm_tokens_total", count, kind=kind, stage=stage)
+    trace = _current.get()
+    if trace is not None:
+        trace.tokens[f"{stage}_{kind}"] += count
+
+
+def record_rewrite(rewritten):
+    ## Standalone-question gate (src/rewrite.py): LLM rewrite made or skipped
+    decision = "rewrite" if rewritten else "skipped"
+    METRICS.inc("dochat_question_rewrite_total", decision=decision)
+    trace = _current.get()
+    if trace is not None:
+        trace.rewrite[decision] += 1
+
+
+def record_error(where):
+    METRICS.inc("dochat_errors_total", where=where)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    ## GET http://host:port/metrics (Prometheus text format), served from a daemon thread
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info("Serving metrics on %s:%d/metrics", host, port)
+    return server
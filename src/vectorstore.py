@@ -1,11 +1,417 @@
+import math
+import time
+import heapq
+import hashlib
+import logging
+import threading
+from contextlib import nullcontext
+from itertools import islice
+from collections import defaultdict, OrderedDict
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
 
+from src import settings
+from src.backends import make_embeddings
+from src.tracing import span, record_span, record_cache
+from src.lexical import BM25Index, attach_lexical, get_lexical
 
-def config_retriever(documents):
+logger = logging.getLogger(__name__)
+
+## One warm embedding model per process, shared by every session
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings():
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                ## DOCHAT_EMBED_BACKEND picks the implementation (src/backends.py)
+                _embeddings = make_embeddings()
+    return _embeddings
+
+
+def prewarm_embeddings(background=False):
+    ## Load the weights (and run one encode) before the first upload arrives
+    def _warm():
+        get_embeddings().embed_query("warm up")
+
+    if background:
+        threading.Thread(target=_warm, name="embeddings-prewarm", daemon=True).start()
+    else:
+        _warm()
+
+
+## ---------------- FAISS index types ---------------- ##
+
+INDEX_TYPES = ("flat", "sq8", "fp16", "hnsw", "ivf", "ivfpq")
+## IVF/PQ training needs a reasonable sample, smaller corpora stay exact
+MIN_IVF_CHUNKS = 2000
+
+
+def choose_index_type(n_chunks=None):
+    ## Config override, otherwise exact search for small corpora and compressed/approximate ones as they grow
+    kind = settings.INDEX_TYPE
+    if kind == "auto":
+        if n_chunks is None or n_chunks < settings.INDEX_HNSW_FROM:
+            kind = "flat"
+        elif n_chunks < settings.INDEX_IVFPQ_FROM:
+            kind = "hnsw"
+        else:
+            kind = "ivfpq"
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {kind!r}, choose one of {INDEX_TYPES} or 'auto'")
+    if kind in ("ivf", "ivfpq") and (n_chunks or 0) < MIN_IVF_CHUNKS:
+        logger.info("Only %s chunks, using a flat index instead of %s", n_chunks, kind)
+        kind = "flat"
+    return kind
+
+
+def make_faiss_index(kind, dimension, n_chunks=None):
+    import faiss
+    if kind == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if kind == "sq8":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+    if kind == "fp16":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+    if kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, settings.HNSW_M)
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        return index
+
+    ## IVF: ~4*sqrt(n) lists, each trained with >= 39 points per centroid
+    nlist = max(1, min(int(4 * math.sqrt(n_chunks)), n_chunks // 39))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if kind == "ivf":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    else:
+        ## 8-bit codes over sub-vectors of 8 dims (384 -> 48 bytes per vector)
+        m = next(m for m in (dimension // 8, dimension // 4, dimension // 2, 1) if m and dimension % m == 0)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, 8)
+    index.nprobe = min(settings.IVF_NPROBE, nlist)
+    return index
+
+
+def train_size(index):
+    ## Vectors to buffer before training (0 when the index needs no training)
+    import faiss
+    if index.is_trained:
+        return 0
+    if isinstance(index, faiss.IndexIVFPQ):
+        ## 256 PQ centroids per sub-quantizer want ~39 points each
+        return max(index.nlist * 39, 256 * 39)
+    if isinstance(index, faiss.IndexIVF):
+        return max(index.nlist * 39, 256)
+    return 1024
+
+
+def supports_removal(vectordb):
+    ## HNSW graphs cannot drop vectors, and IVF `remove_ids` keeps the original labels while
+    ## LangChain's `FAISS.delete` renumbers `index_to_docstore_id` to 0..n-1: both go through `rebuild_without`
+    import faiss
+    return not isinstance(vectordb.index, (faiss.IndexHNSW, faiss.IndexIVF))
+
+
+def empty_vectorstore(model_embed, n_chunks=None, kind=None):
+    dimension = len(model_embed.embed_query("dimension probe"))
+    kind = kind or choose_index_type(n_chunks)
+    vectordb = FAISS(
+        embedding_function=model_embed,
+        index=make_faiss_index(kind, dimension, n_chunks),
+        docstore=InMemoryDocstore(),
+        index_to_docstore_id={},
+    )
+    ## BM25 over the same chunks, filled batch by batch alongside the vectors
+    return attach_lexical(vectordb, BM25Index())
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def embed_into_vectorstore(documents, vectordb=None, model_embed=None, batch_size=None, progress=None, live=None):
+    """
+    Encode chunks batch by batch and add each batch to the index as soon as it is ready,
+    so only one batch of vectors is in flight. `documents` may be any iterable (even a generator).
+    `progress(done, total, chunks_per_sec, eta_seconds)` is called after every batch (total/eta are None when unknown).
+    A new index gets its type from `choose_index_type`; trainable ones (IVF, SQ8) buffer their training sample first.
+    `live` (see src/jobs.py): the index is handed to `live.publish` as soon as it exists and batches are added
+    under `live.lock`, so it can be searched while it grows.
+    """
+    model_embed = model_embed or get_embeddings()
+    batch_size = batch_size or settings.EMBED_BATCH_SIZE
+    total = len(documents) if hasattr(documents, "__len__") else None
+    done = 0
+    start = time.perf_counter()
+    pending = []
+    seconds = {"embed": 0.0, "index": 0.0}
+    if live is not None and vectordb is not None:
+        live.publish(vectordb)
+
+    def flush():
+        index_start = time.perf_counter()
+        texts = [text for text, _, _ in pending]
+        vectors = [vector for _, vector, _ in pending]
+        with live.lock if live is not None else nullcontext():
+            if not vectordb.index.is_trained:
+                vectordb.index.train(np.asarray(vectors, dtype=np.float32))
+            ids = vectordb.add_embeddings(zip(texts, vectors), metadatas=[metadata for _, _, metadata in pending])
+            lexical = get_lexical(vectordb)
+            if lexical is not None:
+                lexical.add(zip(ids, texts))
+        pending.clear()
+        seconds["index"] += time.perf_counter() - index_start
+
+    for batch in _batched(documents, batch_size):
+        texts = [doc.page_content for doc in batch]
+        embed_start = time.perf_counter()
+        vectors = model_embed.embed_documents(texts)
+        seconds["embed"] += time.perf_counter() - embed_start
+        if vectordb is None:
+            vectordb = empty_vectorstore(model_embed, total)
+            if live is not None:
+                live.publish(vectordb)
+        pending.extend(zip(texts, vectors, [doc.metadata for doc in batch]))
+        if len(pending) >= train_size(vectordb.index):
+            flush()
+
+        done += len(batch)
+        if progress is not None:
+            rate = done / max(time.perf_counter() - start, 1e-9)
+            eta = (total - done) / rate if total is not None else None
+            progress(done, total, rate, eta)
+
+    if vectordb is None:
+        return empty_vectorstore(model_embed, 0)
+    if pending:
+        flush()
+    record_span("embed", seconds["embed"])
+    record_span("index", seconds["index"])
+    return vectordb
+
+
+def build_vectorstore(documents, model_embed=None, progress=None, live=None):
     # Create embeddings and store in vectordb
-    model_embed = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectordb = FAISS.from_documents(documents=documents, embedding=model_embed)
-    retriever = vectordb.as_retriever()
+    return embed_into_vectorstore(documents, model_embed=model_embed, progress=progress, live=live)
+
+
+def indexed_files(vectordb):
+    ## file_hash -> docstore ids of its chunks, recovered from the chunk metadata
+    files = {}
+    for doc_id in vectordb.index_to_docstore_id.values():
+        doc = vectordb.docstore.search(doc_id)
+        files.setdefault(doc.metadata.get("file_hash"), []).append(doc_id)
+    return files
+
+
+def rebuild_without(vectordb, remove_ids, batch_size=4096):
+    """
+    Removal for indexes that cannot drop vectors (see `supports_removal`): the kept vectors are read back
+    from the index and added to an empty copy of it (same parameters, IVF training kept), nothing is re-embedded.
+    IVF-PQ vectors come back PQ-decoded, as approximate as they already were.
+    """
+    import faiss
+    removed = set(remove_ids)
+    index = vectordb.index
+    fresh = faiss.clone_index(index)
+    fresh.reset()
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map() ## reconstruct() needs the id -> list position map
+    mapping = {}
+    for start in range(0, index.ntotal, batch_size):
+        vectors = index.reconstruct_n(start, min(batch_size, index.ntotal - start))
+        rows = [i for i in range(len(vectors)) if vectordb.index_to_docstore_id[start + i] not in removed]
+        if rows:
+            for i in rows:
+                mapping[len(mapping)] = vectordb.index_to_docstore_id[start + i]
+            fresh.add(vectors[rows])
+    vectordb.docstore.delete(list(removed))
+    vectordb.index = fresh
+    vectordb.index_to_docstore_id = mapping
+    return vectordb
+
+
+def update_vectorstore(vectordb, documents, remove_ids=None, progress=None, live=None):
+    ## In place: drop the vectors of removed files, embed + add only the new chunks
+    if remove_ids:
+        with span("index"):
+            if supports_removal(vectordb):
+                vectordb.delete(remove_ids)
+            else:
+                rebuild_without(vectordb, remove_ids)
+        lexical = get_lexical(vectordb)
+        if lexical is not None:
+            lexical.remove(remove_ids)
+    if documents:
+        embed_into_vectorstore(documents, vectordb, progress=progress, live=live)
+    return vectordb
+
+
+class HybridRetriever(BaseRetriever):
+    ## Dense (FAISS) + lexical (BM25) candidates fused with reciprocal-rank fusion
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vectordb: FAISS
+    lexical: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _dense_ids(self, query):
+        vector = np.asarray([self.vectordb.embeddings.embed_query(query)], dtype=np.float32)
+        _, indices = self.vectordb.index.search(vector, self.fetch_k)
+        return [self.vectordb.index_to_docstore_id[i] for i in indices[0] if i != -1]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        scores = defaultdict(float)
+        lexical_ids = [doc_id for doc_id, _ in self.lexical.search(query, self.fetch_k)]
+        for ranking in (self._dense_ids(query), lexical_ids):
+            for rank, doc_id in enumerate(ranking):
+                scores[doc_id] += 1.0 / (self.rrf_k + rank + 1)
+        best = heapq.nlargest(self.k, scores.items(), key=lambda item: item[1])
+        return [self.vectordb.docstore.search(doc_id) for doc_id, _ in best]
+
+
+## ---------------- Cross-encoder re-ranking ---------------- ##
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def get_cross_encoder():
+    ## One CPU cross-encoder per process (imported + loaded on first use)
+    global _cross_encoder
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+            _cross_encoder = CrossEncoder(settings.RERANK_MODEL, max_length=512, device="cpu")
+        return _cross_encoder
+
+
+class PairScoreCache:
+    ## (question, chunk text) -> cross-encoder score, LRU, shared by every session
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, text):
+        ## Case/whitespace-insensitive question (the MiniLM cross-encoders are uncased)
+        return hashlib.sha1(f"{' '.join(query.lower().split())}\x00{text}".encode()).digest()
+
+    def get(self, key):
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def put(self, key, score):
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def __len__(self):
+        return len(self._scores)
+
+
+_pair_scores = None
+_pair_scores_lock = threading.Lock()
+
+
+def get_pair_score_cache():
+    global _pair_scores
+    with _pair_scores_lock:
+        if _pair_scores is None:
+            _pair_scores = PairScoreCache(settings.RERANK_CACHE_SIZE)
+        return _pair_scores
+
+
+def score_pairs(query, texts, batch_size=None, cross_encoder=None, cache=None):
+    ## Cross-encoder scores of (query, text), only the pairs not scored before go through the model (in batches)
+    cache = cache if cache is not None else get_pair_score_cache()
+    keys = [PairScoreCache.key(query, text) for text in texts]
+    scores = [cache.get(key) for key in keys]
+    missing = [i for i, score in enumerate(scores) if score is None]
+    for score in scores:
+        record_cache("rerank", score is not None)
+    if missing:
+        model = cross_encoder or get_cross_encoder()
+        predicted = model.predict(
+            [(query, texts[i]) for i in missing],
+            batch_size=batch_size or settings.RERANK_BATCH_SIZE,
+            show_progress_bar=False,
+        )
+        for i, score in zip(missing, predicted):
+            scores[i] = float(score)
+            cache.put(keys[i], scores[i])
+    return scores
+
+
+class RerankRetriever(BaseRetriever):
+    ## Wide candidate set from `base`, re-scored by the cross-encoder, only the `k` best (above `min_score`) are kept.
+    ## The best one is always kept, like the prompt packer does
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base: BaseRetriever
+    k: int = 4
+    min_score: float = float("-inf")
+    batch_size: int = 32
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        candidates = self.base.invoke(query) ## no child callbacks: one "retrieve" span for the whole stage
+        if not candidates:
+            return []
+        start = time.perf_counter()
+        scores = score_pairs(query, [doc.page_content for doc in candidates], self.batch_size)
+        record_span("rerank", time.perf_counter() - start)
+        best = heapq.nlargest(self.k, zip(scores, range(len(candidates))))
+        ## Copies: docstore documents are shared by every session using the index
+        return [
+            Document(page_content=candidates[i].page_content, metadata=dict(candidates[i].metadata, rerank_score=score))
+            for rank, (score, i) in enumerate(best)
+            if rank == 0 or score >= self.min_score
+        ]
+
+
+def make_retriever(vectordb, k=None, rerank=None):
+    rerank = settings.RERANK_ENABLED if rerank is None else rerank
+    if rerank:
+        ## Candidates come from the same first stage, only wider
+        k = k or settings.RERANK_TOP_K
+        base = make_retriever(vectordb, max(settings.RERANK_CANDIDATES, k), rerank=False)
+        return RerankRetriever(base=base, k=k, min_score=settings.RERANK_MIN_SCORE, batch_size=settings.RERANK_BATCH_SIZE)
+    k = k or settings.RETRIEVER_K
+    lexical = get_lexical(vectordb)
+    if settings.RETRIEVAL_MODE == "hybrid" and lexical is not None:
+        return HybridRetriever(
+            vectordb=vectordb, lexical=lexical, k=k, fetch_k=max(settings.RETRIEVER_FETCH_K, k), rrf_k=settings.RRF_K
+        )
+    return vectordb.as_retriever(search_kwargs={"k": k})
+
+
+def config_retriever(documents, vectordb=None, remove_ids=None):
+    ## Incremental mode when the session's existing `vectordb` is passed in
+    if vectordb is None:
+        vectordb = build_vectorstore(documents)
+    else:
+        update_vectorstore(vectordb, documents, remove_ids)
+    retriever = make_retriever(vectordb)
     
-    return retriever
\ No newline at end of file
+    return retriever
+
+
+if __name__ == "__main__":
+    ## `python -m src.vectorstore` downloads + caches the model weights (used by the docker build)
+    prewarm_embeddings()
@@ -0,0 +1,52 @@
+"""The async chain path against the local Groq stub (benchmarks/stub_groq.py): no network, no API key."""
+import os
+import pytest
+
+pytest.importorskip("langchain_groq")
+
+from benchmarks.stub_groq import start_stub_server
+
+## Settings are read at import time: point the Groq client at the stub before importing the app modules
+_server, _url = start_stub_server(latency=0.3)
+os.environ["DOCHAT_GROQ_BASE_URL"] = _url
+os.environ["DOCHAT_ANSWER_CACHE"] = "0"
+os.environ["DOCHAT_EMBED_BACKEND"] = "fake"
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src import settings
+from src.asyncrun import Overloaded, stream_answer, submit
+from src.configchat import config_conversation
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content="Whisper is trained on 680,000 hours of weakly supervised audio.", metadata={"source": "whisper.pdf", "page": 0})]
+
+
+def make_chain():
+    return config_conversation("Groq", "stub-key", FixedRetriever(), "Meta - Llama3")
+
+
+def teardown_module():
+    _server.shutdown()
+
+
+def test_streamed_tokens_join_to_answer():
+    tokens = []
+    response = stream_answer(make_chain(), {"question": "How much audio is Whisper trained on?"}, tokens.append)
+    assert response["answer"].startswith("Stub answer for:")
+    assert len(tokens) > 1
+    assert "".join(tokens) == response["answer"]
+
+
+def test_overloaded_beyond_max_pending(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_PENDING", 2)
+    ## Both turns are still waiting on the stub's latency when the third one is submitted
+    running = [submit(make_chain().ainvoke({"question": f"Question {i}?"})) for i in range(2)]
+    rejected = submit(make_chain().ainvoke({"question": "One too many?"}))
+    with pytest.raises(Overloaded):
+        rejected.result(timeout=10)
+    for future in running:
+        assert future.result(timeout=10)["answer"].startswith("Stub answer for:")